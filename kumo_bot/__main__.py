@@ -18,16 +18,21 @@ def get_mode():
 
 
 if __name__ == "__main__":
+    from kumo_bot.utils.metrics import metrics
+
+    startup = metrics.stopwatch("startup")
     mode = get_mode()
 
     if mode == "debug":
         from kumo_bot.debug_bot import DebugBot
 
-        bot = DebugBot()
+        startup.lap("import")
+        bot = DebugBot(startup)
     elif mode == "prod":
         from kumo_bot.bot import KumoBot
 
-        bot = KumoBot()
+        startup.lap("import")
+        bot = KumoBot(startup=startup)
     else:
         from kumo_bot.setup_bot import SetupBot
 
@@ -0,0 +1,6 @@
+"""Benchmarks of the vote pipeline on synthetic channels.
+
+Run with ``python -m kumo_bot.bench``. Channels, messages and reactions are
+faked from generated scenarios, so no Discord connection or configuration is
+needed, while the vote itself runs through the real cog and local indexes.
+"""
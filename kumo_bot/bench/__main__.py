@@ -0,0 +1,50 @@
+"""Benchmarks a vote over synthetic channels of increasing size, or over a recorded fixture."""
+import argparse
+import asyncio
+import logging
+
+from kumo_bot.bench import fixtures, harness, scenario
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def main() -> None:
+    """Runs the benchmark from the command line."""
+    parser = argparse.ArgumentParser(prog="python -m kumo_bot.bench",
+                                     description="Benchmarks starting and closing a vote on synthetic channels.")
+    parser.add_argument("--messages", type=int, nargs="+", default=list(SIZES), help="Channel sizes to run.")
+    parser.add_argument("--fixture", help="Replay a recorded fixture instead of generated channels.")
+    parser.add_argument("--voters", type=int, default=500, help="Users voting.")
+    parser.add_argument("--authors", type=int, default=2000, help="Users posting in the channel.")
+    parser.add_argument("--submissions", type=int, default=40, help="Link submissions in the channel.")
+    parser.add_argument("--duplicates", type=float, default=0.2, help="Share of extra submissions by one user.")
+    parser.add_argument("--blacklist", type=int, default=20, help="Blacklisted users.")
+    parser.add_argument("--active", type=float, default=0.7, help="Share of voters who posted in the channel.")
+    parser.add_argument("--modes", type=int, nargs="+", choices=range(4), default=[0], help="Vote count modes to run.")
+    parser.add_argument("--cap", type=int, default=8, help="Candidates on the ballot.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per simulated REST page.")
+    parser.add_argument("--live-tally", action="store_true", help="Close from the live tally.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracing memory.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated scenarios.")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's logging.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+
+    if args.fixture:
+        scenarios = [fixtures.load(args.fixture)]
+    else:
+        scenarios = (scenario.generate(size, args.voters, args.authors, args.submissions, args.duplicates,
+                                       args.blacklist, args.active, args.seed) for size in args.messages)
+    for generated in scenarios:
+        runs = []
+        for mode in args.modes:
+            result = asyncio.run(
+                harness.run(generated, mode, args.cap, args.latency, args.live_tally, not args.no_memory))
+            print(harness.format_run(result), flush=True)
+            runs.append(result)
+        if len(runs) > 1:
+            print(harness.format_outcomes(runs), flush=True)
+
+
+if __name__ == "__main__":
+    main()
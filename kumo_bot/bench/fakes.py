@@ -0,0 +1,349 @@
+"""Stand-ins for the Discord objects a vote touches.
+
+Only what the vote pipeline reads is implemented. History and reaction users
+are served from a scenario's id arrays as they are iterated, so channels of a
+million messages never exist as message objects all at once. Everything the
+bot sends goes to a sink that keeps the sent messages only so they can be
+fetched back.
+"""
+import asyncio
+import bisect
+import contextlib
+import datetime
+import itertools
+import pathlib
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import discord
+
+from kumo_bot.bench.scenario import Scenario
+from kumo_bot.config.votes import Vote
+from kumo_bot.utils.activity import ActivityIndex
+from kumo_bot.utils.live_tally import LiveTally
+from kumo_bot.utils.scheduler import Scheduler
+from kumo_bot.utils.submissions import SubmissionLedger
+
+# Items Discord returns per history or reaction page
+PAGE = 100
+
+Bound = Union[discord.abc.Snowflake, datetime.datetime, None]
+
+
+class FakeUser:
+    """A user known only by id."""
+    __slots__ = ("id",)
+    bot = False
+
+    def __init__(self, user_id: int) -> None:
+        self.id = user_id
+
+    @property
+    def mention(self) -> str:
+        """Mention of the user."""
+        return f"<@{self.id}>"
+
+    def __eq__(self, other) -> bool:
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __str__(self) -> str:
+        return str(self.id)
+
+
+class FakeReaction:
+    """A reaction and the ids of the users who added it."""
+
+    def __init__(self, message: "FakeMessage", emoji: str, me: bool = False) -> None:
+        self.message = message
+        self.emoji = emoji
+        self.me = me
+        self.user_ids: List[int] = []
+
+    @property
+    def count(self) -> int:
+        """Users who reacted, the bot included."""
+        return len(self.user_ids) + self.me
+
+    async def users(self):
+        """Yields the users who reacted, a page at a time."""
+        channel = self.message.channel
+        ids = self.user_ids + [channel.bot_user.id] if self.me else self.user_ids
+        for start in range(0, len(ids), PAGE):
+            await channel.page()
+            for user_id in ids[start:start + PAGE]:
+                yield FakeUser(user_id)
+
+
+class FakeMessage:
+    """A message of a fake channel."""
+    __slots__ = ("id", "channel", "author", "content", "embeds", "reactions", "pinned")
+
+    def __init__(self,
+                 message_id: int,
+                 channel: "FakeChannel",
+                 author: FakeUser,
+                 content: str = "",
+                 embeds: Optional[List[discord.Embed]] = None) -> None:
+        self.id = message_id
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.embeds = embeds or []
+        self.reactions: List[FakeReaction] = []
+        self.pinned = False
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        """When the message was sent."""
+        return discord.utils.snowflake_time(self.id)
+
+    def reaction(self, emoji: str) -> FakeReaction:
+        """The reaction of an emoji, added if the message has none yet."""
+        for reaction in self.reactions:
+            if reaction.emoji == emoji:
+                return reaction
+        reaction = FakeReaction(self, emoji)
+        self.reactions.append(reaction)
+        return reaction
+
+    async def add_reaction(self, emoji: str) -> None:
+        """Reacts as the bot."""
+        self.reaction(emoji).me = True
+
+    async def pin(self) -> None:
+        """Pins the message."""
+        self.pinned = True
+
+    async def unpin(self) -> None:
+        """Unpins the message."""
+        self.pinned = False
+
+    async def reply(self, content: Optional[str] = None, **kwargs) -> "FakeMessage":
+        """Replies to the message."""
+        return await self.channel.send(content, **kwargs)
+
+
+def _bound(value: Bound, high: bool) -> Optional[int]:
+    """A history bound as a snowflake, the way discord.py converts it."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return discord.utils.time_snowflake(value, high=high)
+    return value.id
+
+
+class FakeChannel:
+    """A text channel serving a scenario's history.
+
+    Args:
+        scenario: The messages of the channel.
+        bot_user: The bot's user, author of everything sent.
+        latency: Seconds every page of history or reaction users takes,
+            to mimic REST round trips.
+    """
+
+    def __init__(self, scenario: Scenario, bot_user: FakeUser, latency: float = 0.0) -> None:
+        self.id = 900000000000000001
+        self.name = "bench"
+        self.guild = FakeGuild()
+        self.bot_user = bot_user
+        self.latency = latency
+        self.sent: Dict[int, FakeMessage] = {}
+        self._ids = scenario.message_ids
+        self._authors = scenario.author_ids
+        self._submissions = scenario.submissions
+        self._next_id = itertools.count(
+            max(discord.utils.time_snowflake(discord.utils.utcnow()), (self._ids[-1] if self._ids else 0) + 1))
+
+    @property
+    def mention(self) -> str:
+        """Mention of the channel."""
+        return f"<#{self.id}>"
+
+    def __str__(self) -> str:
+        return self.name
+
+    async def page(self) -> None:
+        """Waits out one simulated REST request."""
+        await asyncio.sleep(self.latency)
+
+    def _message(self, position: int) -> FakeMessage:
+        return FakeMessage(self._ids[position], self, FakeUser(self._authors[position]),
+                           self._submissions.get(position, "chatter"))
+
+    def _positions(self, after: Optional[int], before: Optional[int], oldest_first: bool) -> Iterator[int]:
+        low = 0 if after is None else bisect.bisect_right(self._ids, after)
+        high = len(self._ids) if before is None else bisect.bisect_left(self._ids, before)
+        return iter(range(low, high)) if oldest_first else iter(range(high - 1, low - 1, -1))
+
+    async def history(self,
+                      limit: Optional[int] = 100,
+                      before: Bound = None,
+                      after: Bound = None,
+                      oldest_first: Optional[bool] = None):
+        """Yields messages like ``TextChannel.history``, a page at a time."""
+        if oldest_first is None:
+            oldest_first = after is not None
+        positions = self._positions(_bound(after, True), _bound(before, False), oldest_first)
+        if limit is not None:
+            positions = itertools.islice(positions, limit)
+        for count, position in enumerate(positions):
+            if count % PAGE == 0:
+                await self.page()
+            yield self._message(position)
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        """Fetches a message the bot sent."""
+        await self.page()
+        return self.sent[message_id]
+
+    async def send(self,
+                   content: Optional[str] = None,
+                   *,
+                   embed: Optional[discord.Embed] = None,
+                   embeds: Optional[List[discord.Embed]] = None,
+                   **_) -> FakeMessage:
+        """Sends a message into the sink."""
+        message = FakeMessage(next(self._next_id), self, self.bot_user, content or "", [embed] if embed else embeds)
+        self.sent[message.id] = message
+        return message
+
+    async def purge(self, **_) -> List[FakeMessage]:
+        """Deletes nothing."""
+        return []
+
+    def typing(self) -> contextlib.nullcontext:
+        """Shows nothing."""
+        return contextlib.nullcontext()
+
+
+class FakeGuild:
+    """The guild of the fake channel."""
+    id = 900000000000000000
+    filesize_limit = discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+
+    def get_member(self, member_id: int) -> None:
+        """No member is cached."""
+        del member_id
+        return None
+
+
+class BenchVote(Vote):
+    """A vote record living on a fake channel, with its tally kept aside."""
+
+    def __init__(self, bot: "FakeBot", channel: FakeChannel, tally: pathlib.Path) -> None:
+        super().__init__(bot, channel.id, {
+            "guild": channel.guild.id,
+            "lastvote": None,
+            "lastwin": None,
+            "running": False
+        }, lambda: None)
+        self._channel = channel
+        self.tally = LiveTally(tally)
+
+    @property
+    def channel(self) -> FakeChannel:
+        return self._channel
+
+
+class FakeConfig:
+    """The settings a vote reads."""
+
+    def __init__(self, mode: int, blacklist: List[int], democracy: List[int]) -> None:
+        self.vote_count_mode = mode
+        self.blacklist = blacklist
+        self._democracy = democracy
+        self.reaction_concurrency = 4
+        self.debug_tie = False
+
+    def __getitem__(self, key):
+        return {"guild": None}[key]
+
+    @property
+    async def democracy(self) -> List[FakeUser]:
+        """Users exempt from fraud protection."""
+        return [FakeUser(user_id) for user_id in self._democracy]
+
+    def flush(self) -> None:
+        """Nothing is written."""
+
+
+class FakeDownloads:
+    """Download queue handing out a placeholder story for every url."""
+
+    def __init__(self, story: pathlib.Path) -> None:
+        self._story = story
+
+    async def load(self) -> None:
+        """Loads nothing."""
+
+    def cached(self, url: str) -> bool:
+        """Nothing is cached."""
+        del url
+        return False
+
+    def discard(self, job: str) -> None:
+        """Drops nothing."""
+        del job
+
+    def submit(self, url: str, requester: Optional[int] = None, priority: int = 0) -> str:
+        """Queues nothing."""
+        del requester, priority
+        return url
+
+    async def wait(self, job: str) -> Tuple[pathlib.Path, str]:
+        """The placeholder story."""
+        del job
+        return self._story, self._story.name
+
+    def release(self, job: str) -> None:
+        """Releases nothing."""
+        del job
+
+
+class FakeBot:
+    """The parts of the bot a vote uses, with the local indexes in ``workdir``."""
+
+    def __init__(self, config: FakeConfig, workdir: pathlib.Path) -> None:
+        self.config = config
+        self.user = FakeUser(900000000000000002)
+        self.activity_index = ActivityIndex(workdir / "activity.sqlite3")
+        self.submissions = SubmissionLedger(workdir / "submissions.sqlite3")
+        self.scheduler = Scheduler(workdir / "schedule.json")
+        story = workdir / "winner.epub"
+        story.write_bytes(b"bench")
+        self.downloads = FakeDownloads(story)
+
+    def get_channel(self, channel_id: int) -> None:
+        """Channels are handed to the vote directly."""
+        del channel_id
+        return None
+
+    def close(self) -> None:
+        """Closes the local indexes."""
+        self.activity_index.close()
+        self.submissions.close()
+
+
+class FakeInteraction:
+    """An interaction whose responses go to the sink."""
+
+    def __init__(self, user: FakeUser, channel: FakeChannel) -> None:
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild_id = channel.guild.id
+        self.response = _Sink()
+        self.followup = _Sink()
+
+
+class _Sink:
+    """Accepts any response."""
+
+    async def defer(self, **_) -> None:
+        """Defers nothing."""
+
+    async def send(self, *_, **__) -> None:
+        """Sends nothing."""
@@ -0,0 +1,50 @@
+"""Replaying recorded vote fixtures.
+
+The format and the recorder are in ``kumo_bot.utils.fixtures``, this turns a
+fixture back into a scenario the harness can run.
+"""
+import array
+import json
+import pathlib
+from typing import Dict, List, Tuple
+
+import discord
+
+from kumo_bot.bench.scenario import Scenario
+from kumo_bot.utils.fixtures import Path, open_fixture, story_url
+
+
+def load(path: Path) -> Scenario:
+    """Reads a fixture as a scenario.
+
+    Ids are shifted so the vote happens now, keeping the history inside the
+    window the harness's vote looks at.
+    """
+    with open_fixture(path, "r") as fixture:
+        header = json.loads(fixture.readline())
+        shift = (discord.utils.time_snowflake(discord.utils.utcnow()) >> 22) - (header["vote"] >> 22)
+        message_ids = array.array("q")
+        author_ids = array.array("q")
+        submissions: Dict[int, str] = {}
+        ballots: Dict[int, List[int]] = {}
+        for line in fixture:
+            entry = json.loads(line)
+            if entry[0] == "m":
+                if len(entry) > 3:
+                    submissions[len(message_ids)] = story_url(entry[3])
+                message_ids.append(entry[1] + (shift << 22))
+                author_ids.append(entry[2])
+            elif entry[0] == "r":
+                ballots.setdefault(entry[2], []).append(entry[1])
+
+    candidates: List[Tuple[str, List[int]]] = [
+        (story_url(candidate["story"]), candidate["submitters"]) for candidate in header["candidates"]
+    ]
+    return Scenario(pathlib.Path(path).name,
+                    message_ids,
+                    author_ids,
+                    submissions,
+                    ballots,
+                    header["blacklist"],
+                    democracy=header["democracy"],
+                    candidates=candidates)
@@ -0,0 +1,217 @@
+"""Runs a vote end to end over a fake channel.
+
+The real ``VotingCommands`` cog starts a vote on the scenario's channel, the
+scenario's ballots are cast as reactions, and the cog closes the vote again.
+The phases the cog times through ``metrics`` are collected as they are
+recorded, together with the peak memory of each phase and the work done in it.
+"""
+import dataclasses
+import pathlib
+import tempfile
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+from kumo_bot.bench import fakes
+from kumo_bot.bench.scenario import Scenario
+from kumo_bot.cogs.voting import VotingCommands
+from kumo_bot.config import constants
+from kumo_bot.utils import voting
+from kumo_bot.utils.metrics import metrics
+from kumo_bot.utils.reactions import Ballots
+
+# Counters whose growth during a phase is that phase's work, and its unit
+WORK = {
+    "history_scan": ("messages_scanned", "msg"),
+    "reaction_fetch": ("reaction_users", "users"),
+}
+
+OPERATOR = fakes.FakeUser(900000000000000003)
+
+
+@dataclasses.dataclass
+class PhaseResult:
+    """One timed phase of a run.
+
+    Attributes:
+        operation: The operation the phase belongs to.
+        phase: Name of the phase.
+        seconds: Wall time of the phase.
+        peak: Peak traced memory during the phase in bytes, if traced.
+        items: Work done in the phase, if it is counted.
+        unit: Unit of ``items``.
+    """
+    operation: str
+    phase: str
+    seconds: float
+    peak: Optional[int] = None
+    items: Optional[int] = None
+    unit: str = ""
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Items per second."""
+        if not self.items or not self.seconds:
+            return None
+        return self.items / self.seconds
+
+
+@dataclasses.dataclass
+class Run:
+    """The results of one vote over a scenario.
+
+    Attributes:
+        results: What the close stored: winner url, votes per emoji and
+            close time.
+    """
+    scenario: str
+    mode: int
+    voters: int
+    phases: List[PhaseResult]
+    results: Optional[dict] = None
+
+
+class _Recorder:
+    """Collects the phases of a run as the cog records them."""
+
+    def __init__(self, memory: bool) -> None:
+        self.results: List[PhaseResult] = []
+        self._memory = memory
+        self._counts = self._snapshot()
+
+    @staticmethod
+    def _snapshot() -> Dict[str, float]:
+        return {counter: metrics.total(counter) for counter, _ in WORK.values()}
+
+    def __call__(self, operation: str, phase: str, seconds: float) -> None:
+        result = PhaseResult(operation, phase, seconds)
+        counts = self._snapshot()
+        if phase in WORK:
+            counter, result.unit = WORK[phase]
+            result.items = int(counts[counter] - self._counts[counter])
+        self._counts = counts
+        if self._memory and phase == "total":
+            result.peak = max((r.peak for r in self.results if r.operation == operation and r.peak is not None),
+                              default=None)
+        elif self._memory:
+            result.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        self.results.append(result)
+
+
+def post_ballot(votemsg: fakes.FakeMessage, candidates: List[Tuple[str, List[int]]]) -> None:
+    """Replaces the candidates of the vote message with a recorded ballot."""
+    lines = []
+    for i, (url, submitters) in enumerate(candidates):
+        mentions = ", ".join(f"<@{user_id}>" for user_id in submitters)
+        lines.append(f"{constants.EMOJI_ALPHABET[i]} - <{url}> - {mentions}")
+    votemsg.embeds[0].description = "\n".join(lines)
+    for emoji in constants.EMOJI_ALPHABET[:len(candidates)]:
+        votemsg.reaction(emoji).me = True
+
+
+def cast(votemsg: fakes.FakeMessage, ballots: Dict[int, List[int]]) -> Ballots:
+    """Adds the ballots as reactions to the vote message.
+
+    Ballot positions past the candidates of the vote wrap around.
+
+    Returns:
+        The ballots as cast.
+    """
+    emojis = voting.vote_emojis(votemsg)
+    cast_ballots = Ballots()
+    for voter, picks in ballots.items():
+        chosen = list(dict.fromkeys(emojis[pick % len(emojis)] for pick in picks))
+        for emoji in chosen:
+            votemsg.reaction(emoji).user_ids.append(voter)
+        cast_ballots.voters[voter] = chosen
+    return cast_ballots
+
+
+async def run(scenario: Scenario,
+              mode: int = 0,
+              cap: int = 8,
+              latency: float = 0.0,
+              live_tally: bool = False,
+              memory: bool = True) -> Run:
+    """Starts and closes a vote over a scenario.
+
+    Args:
+        scenario: The channel and ballots.
+        mode: Vote count mode of the close.
+        cap: Candidates on the ballot.
+        latency: Seconds every simulated REST page takes.
+        live_tally: Feed the ballots to the live tally, so the close skips
+            fetching reactions.
+        memory: Trace peak memory per phase, at some cost in speed.
+
+    Raises:
+        ValueError: The scenario has no submissions to vote on.
+    """
+    with tempfile.TemporaryDirectory(prefix="kumo-bench-") as tmp:
+        workdir = pathlib.Path(tmp)
+        bot = fakes.FakeBot(fakes.FakeConfig(mode, scenario.blacklist, scenario.democracy), workdir)
+        channel = fakes.FakeChannel(scenario, bot.user, latency)
+        cog = VotingCommands(bot)
+        record = fakes.BenchVote(bot, channel, workdir / "tally.json")
+        recorder = _Recorder(memory)
+        metrics.watch(recorder)
+        if memory:
+            tracemalloc.start()
+        try:
+            await cog.startvote_internal(fakes.FakeInteraction(OPERATOR, channel), record, channel, 0, cap, False,
+                                         False, False)
+            if record.vote_id is None:
+                raise ValueError(f"{scenario.name} has no submissions to vote on.")
+            votemsg = channel.sent[record.vote_id]
+            if scenario.candidates is not None:
+                post_ballot(votemsg, scenario.candidates)
+            ballots = cast(votemsg, scenario.ballots)
+            if live_tally:
+                record.tally.replace(ballots)
+            if memory:
+                tracemalloc.reset_peak()
+            await cog.endvote_internal(fakes.FakeInteraction(OPERATOR, channel), record)
+        finally:
+            metrics.unwatch(recorder)
+            if memory:
+                tracemalloc.stop()
+            await cog.cog_unload()
+            bot.close()
+
+    for result in recorder.results:
+        if result.phase == "tally":
+            result.items, result.unit = len(ballots.voters), "ballots"
+    return Run(scenario.name, mode, len(ballots.voters), recorder.results, record.results)
+
+
+def _size(peak: Optional[int]) -> str:
+    return "-" if peak is None else f"{peak / 2**20:.1f} MiB"
+
+
+def _rate(result: PhaseResult) -> str:
+    throughput = result.throughput
+    return "-" if throughput is None else f"{throughput:,.0f} {result.unit}/s"
+
+
+def format_run(result: Run) -> str:
+    """A run as a table of its phases."""
+    lines = [f"{result.scenario}, {result.voters:,} voters, mode {result.mode}"]
+    header = ("operation".ljust(10), "phase".ljust(15), "wall".rjust(10), "peak".rjust(12), "throughput".rjust(18))
+    lines.append("  " + " ".join(header))
+    for phase in result.phases:
+        lines.append(f"  {phase.operation:<10} {phase.phase:<15} {phase.seconds:>9.3f}s {_size(phase.peak):>12} "
+                     f"{_rate(phase):>18}")
+    return "\n".join(lines)
+
+
+def format_outcomes(runs: List[Run]) -> str:
+    """The winners and vote counts of runs over the same scenario, side by side."""
+    lines = [f"{runs[0].scenario}, outcome by mode"]
+    for result in runs:
+        if result.results is None:
+            lines.append(f"  mode {result.mode}: not closed")
+            continue
+        votes = ", ".join(f"{emoji} {count}" for emoji, count in result.results["votes"].items())
+        winner = result.results["winner"]
+        lines.append(f"  mode {result.mode}: {winner} ({votes})")
+    return "\n".join(lines)
@@ -0,0 +1,108 @@
+"""Synthetic vote scenarios.
+
+A scenario is everything a vote sees of a channel, reduced to ids: the
+message history with its authors, which messages are submissions, who votes
+for which candidates and who is blacklisted. Generating one is kept out of
+the timed runs.
+"""
+import array
+import dataclasses
+import datetime
+import random
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+from kumo_bot.config import constants
+
+# Newest synthetic message, relative to when the scenario is generated
+QUIET = datetime.timedelta(minutes=1)
+
+
+@dataclasses.dataclass
+class Scenario:
+    """A vote channel and its ballots, by id.
+
+    Attributes:
+        name: Shown in reports.
+        message_ids: Snowflakes of the channel's messages, ascending.
+        author_ids: Author of each message, by position.
+        submissions: Positions of submission messages mapped to their url.
+        ballots: Voter ids mapped to the candidates they vote for, as
+            positions on the ballot.
+        blacklist: Blacklisted user ids.
+        democracy: Ids of the users exempt from fraud protection.
+        candidates: The ballot of a recorded vote, as urls and submitter
+            ids. Generated scenarios vote on whatever the vote picks.
+    """
+    name: str
+    message_ids: array.array
+    author_ids: array.array
+    submissions: Dict[int, str]
+    ballots: Dict[int, List[int]]
+    blacklist: List[int]
+    democracy: List[int] = dataclasses.field(default_factory=list)
+    candidates: Optional[List[Tuple[str, List[int]]]] = None
+
+    def __len__(self) -> int:
+        return len(self.message_ids)
+
+
+def generate(messages: int,
+             voters: int = 500,
+             authors: int = 2000,
+             submissions: int = 40,
+             duplicates: float = 0.2,
+             blacklist: int = 20,
+             active: float = 0.7,
+             seed: int = 0) -> Scenario:
+    """Generates a channel and vote of the given shape.
+
+    Messages are spread over the history window up to a minute ago, with a
+    few authors posting most of them.
+
+    Args:
+        messages: Messages in the channel.
+        voters: Users reacting to the vote.
+        authors: Users posting in the channel.
+        submissions: How many messages are link submissions.
+        duplicates: Share of submissions posted by someone who already submitted.
+        blacklist: Blacklisted users, half of them voters.
+        active: Share of voters who posted in the channel.
+        seed: Seed of the generator, equal seeds give equal scenarios.
+    """
+    rng = random.Random(seed)
+    authors = max(1, min(authors, messages))
+    submissions = max(1, min(submissions, messages))
+
+    newest = discord.utils.utcnow() - QUIET
+    span = int((constants.HISTORY_WINDOW - datetime.timedelta(hours=1) - QUIET).total_seconds() * 1000)
+    base = int(newest.timestamp() * 1000) - span - discord.utils.DISCORD_EPOCH
+    times = sorted(rng.randrange(span) for _ in range(messages))
+    message_ids = array.array("q")
+    last = 0
+    for offset in times:
+        last = max(last + 1, (base + offset) << 22)
+        message_ids.append(last)
+
+    pool = [10**17 + i for i in range(authors)]
+    weights = [rng.paretovariate(1.2) for _ in pool]
+    author_ids = array.array("q", rng.choices(pool, weights, k=messages))
+
+    submitted: Dict[int, str] = {}
+    submitters: List[int] = []
+    for story, position in enumerate(sorted(rng.sample(range(messages), submissions))):
+        if submitters and rng.random() < duplicates:
+            author_ids[position] = rng.choice(submitters)
+        else:
+            submitters.append(author_ids[position])
+        submitted[position] = f"https://example.org/s/{story}"
+
+    posters = sorted(set(author_ids))
+    known = min(len(posters), round(voters * active))
+    voter_ids = rng.sample(posters, known) + [2 * 10**17 + i for i in range(voters - known)]
+    ballots = {voter: rng.sample(range(len(constants.EMOJI_ALPHABET)), rng.randint(1, 3)) for voter in voter_ids}
+    banned = rng.sample(voter_ids, min(len(voter_ids), blacklist // 2))
+    banned += [3 * 10**17 + i for i in range(blacklist - len(banned))]
+
+    return Scenario(f"{messages:,} messages", message_ids, author_ids, submitted, ballots, banned)
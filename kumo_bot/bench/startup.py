@@ -0,0 +1,88 @@
+"""Benchmarks the import phase of a cold start.
+
+Every run imports the bot and all cogs in a fresh interpreter, the way
+``python -m kumo_bot`` does before it logs in, and reports how long that took
+and whether FanFicFare was pulled in. FanFicFare is meant to load with the
+first download, so importing it here fails the check, as does going over the
+time budget.
+
+Run with ``python -m kumo_bot.bench.startup``. The other phases of the boot
+need a Discord connection and are logged by the bot itself on every start.
+"""
+import argparse
+import json
+import pathlib
+import statistics
+import subprocess
+import sys
+from typing import List
+
+# Imports the bot like the entry point does, then every cog like setup_hook does.
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import kumo_bot.bot
+from kumo_bot import cogs
+for extension in cogs.EXTENSIONS:
+    __import__(extension)
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "modules": len(sys.modules), "fanficfare": "fanficfare" in sys.modules}))
+"""
+
+# Imports FanFicFare alone, for comparison with the deferred cost.
+_FANFICFARE = """
+import json, time
+started = time.perf_counter()
+import fanficfare.adapters, fanficfare.cli
+print(json.dumps({"seconds": time.perf_counter() - started}))
+"""
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+
+
+def probe(code: str) -> dict:
+    """Runs a probe in a fresh interpreter, returning what it printed.
+
+    Raises:
+        RuntimeError: The probe failed.
+    """
+    done = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=False)
+    if done.returncode != 0:
+        raise RuntimeError(done.stderr.strip().splitlines()[-1] if done.stderr.strip() else "Probe failed.")
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    """Runs the benchmark from the command line, exiting non-zero if the check fails."""
+    parser = argparse.ArgumentParser(prog="python -m kumo_bot.bench.startup",
+                                     description="Benchmarks importing the bot and its cogs from cold.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time.")
+    parser.add_argument("--budget", type=float, default=3.0, help="Most seconds the median import may take.")
+    parser.add_argument("--fanficfare", action="store_true", help="Also time importing FanFicFare alone.")
+    args = parser.parse_args()
+
+    results: List[dict] = [probe(_PROBE) for _ in range(max(1, args.runs))]
+    times = [result["seconds"] for result in results]
+    median = statistics.median(times)
+    modules = results[-1]["modules"]
+    print(f"import: median {median:.3f}s, min {min(times):.3f}s, max {max(times):.3f}s "
+          f"over {len(times)} runs, {modules} modules")
+    if args.fanficfare:
+        try:
+            seconds = probe(_FANFICFARE)["seconds"]
+            print(f"fanficfare: {seconds:.3f}s, deferred to the first download")
+        except RuntimeError as e:
+            print(f"fanficfare: not importable ({e})")
+
+    failures = []
+    if any(result["fanficfare"] for result in results):
+        failures.append("FanFicFare was imported at startup.")
+    if median > args.budget:
+        failures.append(f"The median import took {median:.3f}s, over the {args.budget:.3f}s budget.")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
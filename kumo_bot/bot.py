@@ -1,31 +1,54 @@
 """Main bot class for KumoFeaturedBot."""
+import asyncio
 import logging
+from typing import Optional
 
 import discord
 from discord.ext import commands
-from fanficfare import cli, loghandler
 
-from kumo_bot.config.constants import handler, intents
+from kumo_bot.config import profiles
+from kumo_bot.config.constants import DOWNLOAD_USER_LIMIT, DOWNLOAD_WORKERS, ddir, file_handler, handler
 from kumo_bot.config.settings import Config, Secret
+from kumo_bot.utils import auth, downloaders, logs, metrics
+from kumo_bot.utils.activity import ActivityIndex
+from kumo_bot.utils.download_queue import DownloadQueue
+from kumo_bot.utils.scheduler import Scheduler
+from kumo_bot.utils.submissions import SubmissionLedger
 from kumo_bot import cogs
 
 
 class KumoBot(commands.Bot):
-    """Main bot class."""
+    """Main bot class.
+
+    Args:
+        debug: Whether the bot runs in debug mode.
+        pfx: Command prefix, the configured one by default.
+        startup: Stopwatch started before the bot's modules were imported,
+            the boot is timed from construction without one.
+    """
     debug: bool = False
 
-    def __init__(self, debug: bool = False, pfx: str | None = None):
+    def __init__(self, debug: bool = False, pfx: str | None = None, startup: Optional[metrics.Stopwatch] = None):
+        self.startup = startup or metrics.metrics.stopwatch("startup")
+        # The configuration picks the deployment profile, so it is read before connecting
+        self.config = Config(self)
+        self.profile = profiles.get(self.config.profile)
         super().__init__(
             command_prefix=commands.when_mentioned,
-            intents=intents,
             status=discord.Status.online,
             activity=discord.Activity(type=discord.ActivityType.watching, name="for voter fraud."),
+            **self.profile.options(),
         )
+        logging.info("Using the %s deployment profile.", self.profile.name)
 
-        # Initialize configuration and secrets
-        self.config = Config(self)
+        # Initialize secrets and authorization
         self.secret = Secret()
+        self.auth = auth.Authorizer()
         self.debug = debug
+        self.activity_index = ActivityIndex(ddir / "activity.sqlite3")
+        self.submissions = SubmissionLedger(ddir / "submissions.sqlite3")
+        self.scheduler = Scheduler(ddir / "schedule.json")
+        self.downloads = DownloadQueue(DOWNLOAD_WORKERS, DOWNLOAD_USER_LIMIT)
 
         # Set up command prefix from config
         self.command_prefix = pfx or self.config.prefix
@@ -33,12 +56,13 @@ class KumoBot(commands.Bot):
         # Set up logging
         self.l_handler = handler
         handler.setLevel(logging.INFO)
-        loghandler.setLevel(logging.CRITICAL)
-        log_stuff = cli.logger
-        log_stuff.addHandler(handler)
+        if self.config.log_format == "json":
+            file_handler.setFormatter(logs.JsonFormatter())
+        self.startup.lap("config")
 
     async def setup_hook(self):
         """Setup hook called when the bot is starting."""
+        self.startup.lap("login")
         logging.info("Loading cogs...")
         for extension in cogs.EXTENSIONS:
             try:
@@ -47,7 +71,40 @@ class KumoBot(commands.Bot):
             except commands.ExtensionError as err:
                 logging.error("Failed to load cog %s: %s", extension, err)
         logging.info("Finished loading cogs.")
+        self.startup.lap("cogs")
+        metrics.instrument_http(self.http)
+        self._metrics_server = None
+        if self.config.metrics_port:
+            self._metrics_server = await metrics.serve("127.0.0.1", self.config.metrics_port)
+        self._startup_task = asyncio.create_task(self._log_startup())
+        self.downloads.start()
+
+    async def _log_startup(self):
+        """Logs the startup timeline once the bot is first ready."""
+        await self.wait_until_ready()
+        self.startup.lap("ready")
+        total = self.startup.finish()
+        logging.info("Started in %.2fs: %s", total,
+                     ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.startup.laps))
+
+    async def application_info(self) -> discord.AppInfo:
+        """Fetches the bot's application, refreshing the owners checks allow."""
+        info = await super().application_info()
+        self.auth.refresh(info)
+        return info
+
+    async def close(self):
+        """Closes the bot, making sure pending config changes are written."""
+        self.scheduler.stop()
+        await super().close()
+        self.config.flush()
+        self.downloads.stop()
+        downloaders.pool.shutdown()
+        downloaders.cache.flush()
+        if getattr(self, "_metrics_server", None) is not None:
+            await self._metrics_server.cleanup()
 
     def run_bot(self):
         """Run the bot."""
-        self.run(self.secret.token, log_handler=handler, root_logger=True)
+        logs.install(handler)
+        self.run(self.secret.token, log_handler=None)
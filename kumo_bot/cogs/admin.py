@@ -7,7 +7,10 @@ from discord import app_commands
 from discord.ext import commands
 
 from kumo_bot.config import constants
-from kumo_bot.utils import checks, downloaders
+from kumo_bot.utils import checks, epub, logs
+from kumo_bot.utils.download_queue import DownloadQueueFull
+from kumo_bot.utils.metrics import metrics
+from kumo_bot.utils.throttle import CircuitOpen
 
 
 class AdminCommands(commands.Cog):
@@ -63,6 +66,7 @@ class AdminCommands(commands.Cog):
     async def accessrole(self, interaction: discord.Interaction, addrole: discord.Role) -> None:
         """Sets the <addrole> as the bot role."""
         self.bot.config.role = addrole
+        self.bot.auth.clear()
 
         await interaction.response.send_message(f"Role {addrole} has been set as to have access.", ephemeral=True)
 
@@ -105,15 +109,41 @@ class AdminCommands(commands.Cog):
         await interaction.response.defer(thinking=True)
         logging.info("Downloading fic from %s", url)
 
+        queue = self.bot.downloads
+        await queue.load()
         try:
-            file = await asyncio.wait_for(downloaders.fetch_download(url), timeout=800)
+            job = queue.submit(url, interaction.user.id)
+        except DownloadQueueFull as e:
+            await interaction.followup.send(str(e))
+            return
+        try:
+            if job.started is None:
+                await interaction.edit_original_response(content=f"Queued at position {queue.position(job) + 1}, "
+                                                         f"estimated wait about {round(queue.eta(job) / 60)} minutes.")
+            phases = metrics.stopwatch("download")
+            logs.bind(phase="download")
+            path, name = await asyncio.wait_for(queue.wait(job), timeout=800)
+            phases.lap("fetch")
+            limit = (interaction.guild.filesize_limit
+                     if interaction.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES)
+            files = await epub.fit_upload(path, name, limit)
+            phases.lap("fit")
+        except CircuitOpen as e:
+            logging.info("Not downloading fic. %s", e)
+            await interaction.followup.send(f"Error while downloading fic. {e}")
+            return
         except (asyncio.TimeoutError, ConnectionError, ValueError) as e:
             logging.warning("Failed to download fic. %s Error Stack:\n", e, exc_info=True)
-            file = None
-        if file is None:
+            files = None
+        finally:
+            queue.release(job)
+        if files is None:
             await interaction.followup.send("Error while downloading fic.")
             return
-        await interaction.followup.send(file=file)
+        for file in files:
+            await interaction.followup.send(file=file)
+        phases.lap("upload")
+        phases.finish()
 
 
 async def setup(bot):
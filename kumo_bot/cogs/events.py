@@ -4,6 +4,8 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
+from kumo_bot.utils import voting
+
 
 class Events(commands.Cog):
     """Events cog for handling bot events."""
@@ -57,15 +59,25 @@ class Events(commands.Cog):
         cg = self.bot.get_cog("VotingCommands")
 
         logging.info("%s has connected to Discord!", str(self.bot.user))
-        if config.armed:
-            return
+        for record in config.votes.running():
+            prefetcher = cg.prefetcher(record)
+            if prefetcher.status:
+                continue
+            try:
+                votemsg = await record.lastvote
+            except (discord.HTTPException, ValueError) as e:
+                logging.warning("Could not restart prefetching for the vote in %s: %s", record.channel_id, e)
+                continue
+            if votemsg is not None:
+                prefetcher.start([url for url, _ in voting.parse_votemsg(votemsg)])
         if config.closetime:
-            config.armed = True
-            logging.info("Resuming vote at %s", config.closetime)
-            await discord.utils.sleep_until(config.closetime)
-            logging.info("Closing vote via INTERNAL event.")
-            await cg.endvote_internal("INTERNAL")
-        config.armed = True
+            # Close times used to live in the config, hand them to the scheduler.
+            record = config.votes.get(config["channel"])
+            if record is not None and record.running:
+                logging.info("Moving close time %s to the scheduler.", config.closetime)
+                self.bot.scheduler.schedule(voting.close_key(record.vote_id), "close_vote", config.closetime)
+            config.closetime = None
+        self.bot.scheduler.start()
 
 
 async def setup(bot):
@@ -1,15 +1,28 @@
 """Owner-only commands for the bot."""
 import asyncio
+import datetime
+import gc
 import logging
 import os
+from typing import List, Optional
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
-from kumo_bot.utils import checks
+from kumo_bot.utils import checks, downloaders, fixtures, logs, reports, voting
+from kumo_bot.utils.metrics import metrics, peak_rss, rss
 from kumo_bot.config import constants
 
+# Log lines /override log sends by default and at most, and the messages they may take
+TAIL_LINES = 50
+TAIL_MAX_LINES = 500
+TAIL_MESSAGES = 10
+
+
+def _mib(size: Optional[int]) -> str:
+    return "unknown" if size is None else f"{size / 1024 ** 2:.1f} MiB"
+
 
 class OwnerCommands(commands.Cog):
     """Owner-only commands cog."""
@@ -34,10 +47,12 @@ class OwnerCommands(commands.Cog):
 
         elif command == "log":
             logging.info("Sending Log...")
-            fpath = constants.ldir / "discord.log"
-            await interaction.user.send(file=discord.File(fp=fpath))
+            await interaction.user.send(file=discord.File(fp=constants.log_file))
             await interaction.followup.send("Sent!")
 
+        elif command.startswith("log "):
+            await self.log_tail(interaction, command.split()[1:])
+
         elif command == "pull":
             pull = await asyncio.create_subprocess_shell(
                 "git pull",
@@ -68,39 +83,156 @@ class OwnerCommands(commands.Cog):
             config.debug_tie = not config.debug_tie
             logging.info("Debug Tie toggled: %s", config.debug_tie)
             await interaction.followup.send(f"Debug Tie toggled: {config.debug_tie}")
+        elif command in ("activitycheck", "activityrepair"):
+            record = config.votes.get(interaction.channel_id)
+            channel = record.channel if record is not None else config.channel
+            before = discord.utils.utcnow()
+            after = before - constants.HISTORY_WINDOW
+            await self.bot.activity_index.sync(channel, after)
+            mismatches = await self.bot.activity_index.verify(channel,
+                                                              after,
+                                                              before,
+                                                              repair=command == "activityrepair")
+            if not mismatches:
+                await interaction.followup.send("Activity index matches channel history.")
+                return
+            lines = [
+                f"<@{author}> - indexed {indexed}, scanned {scanned}"
+                for author, (indexed, scanned) in list(mismatches.items())[:20]
+            ]
+            await interaction.followup.send(f"Activity index differs for {len(mismatches)} users:\n" + "\n".join(lines),
+                                            allowed_mentions=discord.AllowedMentions.none())
+        elif command == "schedule":
+            jobs = self.bot.scheduler.jobs()
+            if not jobs:
+                await interaction.followup.send("Nothing is scheduled.")
+                return
+            lines = []
+            for job in jobs:
+                when = discord.utils.format_dt(job.when, "R")
+                lines.append(f"{job.key} - {job.action} - {when}")
+            await interaction.followup.send("\n".join(lines))
+        elif command == "record":
+            record = config.votes.get(interaction.channel_id) or config.votes.get(config["channel"])
+            if record is None or record.vote_id is None:
+                await interaction.followup.send("No vote to record.")
+                return
+            # Reactions have to be current, so the cached message will not do.
+            record.invalidate_message(record.vote_id)
+            votemsg = await record.lastvote
+            path = constants.ddir / "fixtures" / f"vote-{votemsg.id}.jsonl.gz"
+            path.parent.mkdir(exist_ok=True)
+            democracy = [member.id for member in await config.democracy]
+            count = await fixtures.record(votemsg, path, config.blacklist, democracy)
+            logging.info("Recorded vote %s with %d messages to %s.", votemsg.id, count, path)
+            note = f"Recorded vote {votemsg.id} with {count} messages to {path.name}."
+            if path.stat().st_size > discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES:
+                await interaction.followup.send(f"{note} It is too large to send and was kept in the data directory.")
+                return
+            await interaction.user.send(note, file=discord.File(fp=path))
+            await interaction.followup.send("Sent!")
+        elif command == "memory":
+            await interaction.followup.send(embed=self.memory_report())
+        elif command == "stats":
+            started = discord.utils.format_dt(datetime.datetime.fromtimestamp(metrics.started), "R")
+            embed = discord.Embed(title="Runtime Stats",
+                                  description=f"Started {started}\n{metrics.summary()}"[:4096],
+                                  colour=discord.Colour.teal())
+            await interaction.followup.send(embed=embed)
         else:
             await interaction.followup.send("Invalid override command.")
 
+    async def log_tail(self, interaction: discord.Interaction, args: List[str]) -> None:
+        """Sends the newest log lines matching a filter, as ``/override log [lines] [key=value...] [text]``.
+
+        Fields such as ``vote``, ``phase`` or ``level`` filter JSON lines, any
+        other words are text the lines have to contain.
+        """
+        count = TAIL_LINES
+        if args and args[0].isdigit():
+            count = max(1, min(int(args.pop(0)), TAIL_MAX_LINES))
+        fields = dict(arg.split("=", 1) for arg in args if "=" in arg)
+        text = " ".join(arg for arg in args if "=" not in arg) or None
+        lines = await asyncio.to_thread(logs.tail, constants.log_file, count, fields, text)
+        if not lines:
+            await interaction.followup.send("No matching log lines.", ephemeral=True)
+            return
+        fence = "```"
+        pages = reports.paginate((line.replace(fence, "`\u200b``") for line in lines), 2000 - len(fence) * 2 - 2)
+        for page in pages[-TAIL_MESSAGES:]:
+            await interaction.followup.send(f"{fence}\n{page}\n{fence}", ephemeral=True)
+
+    def memory_report(self) -> discord.Embed:
+        """Resident memory of the bot and the size of its caches."""
+        profile = self.bot.profile
+        messages = "disabled"
+        if profile.max_messages is not None:
+            messages = f"{len(self.bot.cached_messages)} of {profile.max_messages}"
+        return discord.Embed(
+            title="Memory",
+            colour=discord.Colour.teal(),
+            description=f"**PROFILE**: {profile.name}\n"
+            f"**RSS**: {_mib(rss())}, peak {_mib(peak_rss())}\n"
+            f"**GUILDS**: {len(self.bot.guilds)}\n"
+            f"**MEMBERS CACHED**: {sum(len(guild.members) for guild in self.bot.guilds)}\n"
+            f"**USERS CACHED**: {len(self.bot.users)}\n"
+            f"**MESSAGES CACHED**: {messages}\n"
+            f"**RESOLVED MEMBERS**: {self.bot.config.cached_members}\n"
+            f"**DOWNLOAD CACHE**: {len(downloaders.cache)} stories, {downloaders.cache.size // 1024 ** 2} MiB on disk\n"
+            f"**PYTHON OBJECTS**: {len(gc.get_objects())}",
+        )
+
     @app_commands.command(name="configuration", description="Displays the current configuration of the bot.")
     @checks.is_owner()
     async def configuration(self, interaction: discord.Interaction) -> None:
         """This command is used to check the current configuration of the bot."""
         config = self.bot.config
 
-        last_vote = await config.lastvote
-        last_win = await config.lastwin
         democracy = await config.democracy
+        votes = []
+        for record in config.votes:
+            state = "running" if record.running else "idle"
+            line = f"<#{record.channel_id}> - {state}"
+            base = f"https://discord.com/channels/{record.guild_id}/{record.channel_id}"
+            if record.vote_id is not None:
+                line += f" - [last vote]({base}/{record.vote_id})"
+            if record.win_id is not None:
+                line += f" - [last win]({base}/{record.win_id})"
+            close = self.bot.scheduler.get(voting.close_key(record.vote_id))
+            if record.running and close is not None:
+                closes = discord.utils.format_dt(close.when, "R")
+                line += f" - closes {closes}"
+            votes.append(line)
         readable_config = discord.Embed(
             title="Current Configuration",
             colour=discord.Colour.teal(),
             description=f"**MODE**: {config.mode}\n"
+            f"**PROFILE**: {config.profile}\n"
             f"**GUILD**: {config.guild.name}\n"
             f"**CHANNEL**: {config.channel.mention}\n"
             f"**BOT OPERATOR**: {config.role.mention}\n"
             f"**MENTION**: {config.mention.mention}\n"
-            f"**LAST VOTE**: {last_vote.jump_url}\n"
-            f"**LAST WIN**: {last_win.jump_url}\n"
-            f"**CLOSETIME**: <t:{config.closetime}:f>\n"
-            f"**CURRENTLY RUNNING**: {config.vote_running}\n"
             f"**OWNER ROLE**: <@&{config.owner_role}>\n"
             f"**VOTE COUNT MODE**: {config.vote_count_mode}\n"
-            f"**DEBUG TIES**: {config.debug_tie}",
+            f"**DEBUG TIES**: {config.debug_tie}\n"
+            f"**MEMBER CACHE**: {config.member_hits} hits, {config.member_misses} misses\n"
+            f"**AUTHORIZATION CACHE**: {len(self.bot.auth)} decisions, {self.bot.auth.hits} hits, "
+            f"{self.bot.auth.misses} misses\n"
+            f"**DOWNLOAD CACHE**: {len(downloaders.cache)} stories, {downloaders.cache.size // 1024 ** 2} MiB, "
+            f"{downloaders.cache.hits} hits, {downloaders.cache.misses} misses",
+        ).add_field(
+            name="Votes",
+            value="\n".join(votes) or "No votes yet.",
+            inline=False,
         ).add_field(
             name="Currently Blacklisted",
             value="\n".join([f"<@{a}>" for a in config.blacklist]),
         ).add_field(
             name="Current Democracy:tm: users",
             value="\n".join([a.mention for a in democracy]),
+        ).add_field(
+            name="Fiction Sites",
+            value=downloaders.hosts.describe() or "No fetches yet.",
         )
         await interaction.response.send_message(embed=readable_config,
                                                 ephemeral=True,
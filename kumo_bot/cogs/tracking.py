@@ -0,0 +1,169 @@
+"""Tracking cog keeping the local channel indexes up to date."""
+import asyncio
+import logging
+from typing import Optional
+
+import discord
+from discord.ext import commands, tasks
+
+from kumo_bot.config import constants
+from kumo_bot.config.votes import Vote
+from kumo_bot.utils import reactions, voting
+from kumo_bot.utils.live_tally import LiveTally
+
+
+class Tracking(commands.Cog):
+    """Feeds gateway events into the bot's local indexes."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.save_tally.start()
+
+    async def cog_unload(self):
+        self.save_tally.cancel()
+        for record in self.bot.config.votes:
+            record.tally.save()
+
+    @tasks.loop(seconds=30)
+    async def save_tally(self):
+        """Periodically saves the live vote tallies."""
+        for record in self.bot.config.votes:
+            if record.tally.dirty:
+                record.tally.save()
+
+    def tally(self, message_id: int) -> Optional[LiveTally]:
+        """The live tally of a vote message, if it is one."""
+        record = self.bot.config.votes.by_message(message_id)
+        return record.tally if record is not None else None
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        """Indexes new messages."""
+        self.bot.activity_index.record(message)
+        self.bot.submissions.record(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """Follows edited submissions and configured messages."""
+        self.bot.submissions.edit(payload)
+        self.bot.config.votes.invalidate_message(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """Drops deleted messages from the indexes."""
+        self.bot.activity_index.forget([payload.message_id])
+        self.bot.submissions.forget([payload.message_id])
+        self.bot.config.votes.invalidate_message(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        """Drops purged messages from the indexes."""
+        self.bot.activity_index.forget(payload.message_ids)
+        self.bot.submissions.forget(payload.message_ids)
+        for message_id in payload.message_ids:
+            self.bot.config.votes.invalidate_message(message_id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        """Drops cached members and decisions that changed."""
+        del before
+        self.bot.config.invalidate_member(after.id)
+        self.bot.auth.invalidate_member(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        """Drops cached members and decisions of members that left."""
+        self.bot.config.invalidate_member(member.id)
+        self.bot.auth.invalidate_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        """Drops the decisions of a guild whose role permissions may have changed."""
+        del before
+        self.bot.auth.invalidate_guild(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        """Drops the decisions of a guild that lost a role."""
+        self.bot.auth.invalidate_guild(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        """Drops the decisions of a guild whose owner may have changed."""
+        del before
+        self.bot.auth.invalidate_guild(after.id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        """Tallies vote reactions."""
+        tally = self.tally(payload.message_id)
+        if tally is not None and payload.user_id != self.bot.user.id:
+            tally.add(payload)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        """Tallies removed vote reactions."""
+        tally = self.tally(payload.message_id)
+        if tally is not None and payload.user_id != self.bot.user.id:
+            tally.remove(payload)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        """Tallies cleared vote reactions."""
+        tally = self.tally(payload.message_id)
+        if tally is not None:
+            tally.clear(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload: discord.RawReactionClearEmojiEvent):
+        """Tallies a cleared vote option."""
+        tally = self.tally(payload.message_id)
+        if tally is not None:
+            tally.clear(payload.message_id, str(payload.emoji))
+
+    async def resync_tally(self, record: Vote) -> None:
+        """Rebuilds a live tally from its vote message after events may have been missed."""
+        tally = record.tally
+        if tally.message_id is None:
+            return
+        tally.gap = True
+        try:
+            votemsg = await record.channel.fetch_message(tally.message_id)
+            emojis = voting.vote_emojis(votemsg)
+            ballots = await reactions.collect_voters(votemsg.reactions, emojis, self.bot.config.reaction_concurrency,
+                                                     self.bot.user.id)
+        except (discord.HTTPException, ValueError) as e:
+            logging.warning("Failed to resync the live vote tally: %s", e)
+            return
+        tally.replace(ballots)
+        logging.info("Resynced live vote tally with %d voters.", len(ballots.voters))
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Catches up on messages and reactions sent while the bot was away."""
+        self.bot.activity_index.suspend()
+        self.bot.submissions.suspend()
+        await asyncio.gather(*(self.resync_tally(record) for record in self.bot.config.votes))
+        now = discord.utils.utcnow()
+        for channel_id in self.bot.submissions.tracked():
+            channel = self.bot.get_channel(channel_id)
+            if not isinstance(channel, (discord.TextChannel, discord.Thread)):
+                continue
+            try:
+                await self.bot.submissions.sync(channel, now - constants.HISTORY_WINDOW)
+            except discord.HTTPException as e:
+                logging.warning("Failed to catch up on submissions in %s: %s", channel, e)
+        for record in self.bot.config.votes:
+            if not self.bot.activity_index.tracks(record.channel_id):
+                continue
+            try:
+                channel = record.channel
+                await self.bot.activity_index.sync(channel, now - constants.HISTORY_WINDOW)
+                self.bot.activity_index.prune(channel.id, now - constants.HISTORY_WINDOW * 2)
+            except (discord.HTTPException, ValueError) as e:
+                logging.warning("Failed to catch up on activity in %s: %s", record.channel_id, e)
+
+
+async def setup(bot):
+    """Setup function to add the cog to the bot."""
+    await bot.add_cog(Tracking(bot))
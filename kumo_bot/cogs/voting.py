@@ -2,16 +2,18 @@
 import asyncio
 import datetime
 import logging
-import re
 from random import choice, shuffle, randint
-from typing import Dict, Union, List
+from typing import Dict, Optional, Union, List
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
+from kumo_bot import tally
 from kumo_bot.config import constants
-from kumo_bot.utils import checks, voting, downloaders
+from kumo_bot.config.votes import Vote
+from kumo_bot.utils import checks, epub, logs, prefetch, reactions, reports, voting
+from kumo_bot.utils.metrics import metrics
 
 
 class VotingCommands(commands.Cog):
@@ -19,7 +21,41 @@ class VotingCommands(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.double_clause = False
+        self.prefetchers: Dict[int, prefetch.Prefetcher] = {}
+        bot.scheduler.register("close_vote", self.scheduled_close)
+
+    async def cog_unload(self):
+        for prefetcher in self.prefetchers.values():
+            prefetcher.cancel()
+
+    def prefetcher(self, record: Vote) -> prefetch.Prefetcher:
+        """The prefetcher of a vote's candidates."""
+        prefetcher = self.prefetchers.get(record.channel_id)
+        if prefetcher is None:
+            prefetcher = prefetch.Prefetcher(self.bot.downloads, constants.PREFETCH_CONCURRENCY, timeout=1200)
+            self.prefetchers[record.channel_id] = prefetcher
+        return prefetcher
+
+    def mention_role(self, guild: discord.Guild) -> Optional[discord.Role]:
+        """The role pinged about votes, which is only configured for the main guild."""
+        config = self.bot.config
+        if guild.id != config["guild"]:
+            return None
+        return config.mention
+
+    async def scheduled_close(self, key: str) -> None:
+        """Closes the vote a scheduled close was set for, if it is still running."""
+        await self.bot.wait_until_ready()
+        for record in self.bot.config.votes.running():
+            if key == voting.close_key(record.vote_id):
+                logging.info("Closing vote in %s via scheduled close.", record.channel_id)
+                try:
+                    await self.endvote_internal("INTERNAL", record)
+                except app_commands.AppCommandError as e:
+                    # The vote can't be closed as it stands, retrying would not change that.
+                    logging.warning("Scheduled close %s failed: %s", key, e)
+                return
+        logging.info("Scheduled close %s is for a vote that is no longer running.", key)
 
     @app_commands.command(name="startvote", description="Starts a vote.")
     @app_commands.guild_only()
@@ -42,43 +78,55 @@ class VotingCommands(commands.Cog):
                         presend: bool = False,
                         allow_duplicates: bool = False) -> None:
         """This command is used to start a vote."""
-        config = self.bot.config
-
         invalid_channel_types = (discord.StageChannel, discord.ForumChannel, discord.CategoryChannel)
 
-        submitted = {}
-        submitted_old = []
-        submitees = []
-
         intchannel = interaction.channel
         if isinstance(intchannel, invalid_channel_types) or intchannel is None:
             raise app_commands.AppCommandError("This channel is not a text channel.")
 
-        winmsg = await config.lastwin
+        record = self.bot.config.votes.open(cha)
+        if record.running or record.lock.locked():
+            raise app_commands.AppCommandError(f"A vote is already running in {cha.mention}.")
+        async with record.lock:
+            await self.startvote_internal(interaction, record, cha, polltime, cap, clear, presend, allow_duplicates)
+
+    async def startvote_internal(self, interaction: discord.Interaction, record: Vote, cha: discord.TextChannel,
+                                 polltime: int, cap: int, clear: bool, presend: bool, allow_duplicates: bool) -> None:
+        """Starts a vote in a channel while holding the vote's lock."""
+        config = self.bot.config
+        phases = metrics.stopwatch("startvote")
+        logs.bind(channel=record.channel_id, phase="startvote")
+        intchannel = interaction.channel
+
+        submitted: Dict[str, List[str]] = {}
+        submitted_old = []
+        submitees = set()
+
+        winmsg, votemsg = await asyncio.gather(record.lastwin, record.lastvote)
         if winmsg is not None:
             await winmsg.unpin()
 
-        votemsg = await config.lastvote
         if votemsg is not None:
             await votemsg.unpin()
 
         if votemsg is not None:
             submitted_old = voting.parse_votemsg(votemsg)
 
-        role = config.mention
+        role = self.mention_role(cha.guild)
         await interaction.response.defer(thinking=True, ephemeral=True)
         async with intchannel.typing():
-            async for message in intchannel.history(limit=None, oldest_first=True):
-                if message.content.startswith("https://") and (message.author not in submitees or allow_duplicates):
-                    url = re.search(r"(?P<url>https?://\S+)", message.content)
-                    if url is None or url in submitted_old or message.author.id in config.blacklist:
-                        continue
-                    if url not in submitted:
-                        submitted[str(url.group("url"))] = [message.author.mention]
-                        submitees.append(message.author)
-                    else:
-                        submitted[str(url.group("url"))].append(message.author.mention)
-                        submitees.append(message.author)
+            since = discord.utils.utcnow() - constants.HISTORY_WINDOW
+            await self.bot.submissions.sync(intchannel, since)
+            old_urls = {url for url, _ in submitted_old}
+            blacklist = set(config.blacklist)
+            for entry in self.bot.submissions.entries(intchannel.id, since):
+                if entry.author_id in submitees and not allow_duplicates:
+                    continue
+                if entry.url in old_urls or entry.author_id in blacklist:
+                    continue
+                submitted.setdefault(entry.url, []).append(f"<@{entry.author_id}>")
+                submitees.add(entry.author_id)
+        phases.lap("history_scan")
 
         if len(submitted) == 0:
             await interaction.followup.send("No submissions found in the last 31 days.", ephemeral=True)
@@ -136,8 +184,6 @@ class VotingCommands(commands.Cog):
                                            text="This thread is not for conversation.")
                 await intchannel.send(embed=embd)
 
-        # Set channel for voting
-        config.channel = cha
         # Send vote message
         mention_text = role.mention if role else ""
         vote_msg = await cha.send(f"{mention_text} Vote is starting!",
@@ -149,90 +195,114 @@ class VotingCommands(commands.Cog):
 
         # Pin vote message
         await vote_msg.pin()
-        config.lastvote = vote_msg
+        phases.lap("post")
+        logs.bind(vote=vote_msg.id)
+        record.lastvote = vote_msg
+        record.tally.start(vote_msg.id, constants.EMOJI_ALPHABET[:len(submitted)])
+        self.prefetcher(record).start([url for url, _ in submitted])
 
         # Set vote as running
-        config.vote_running = True
+        record.running = True
+
+        config.flush()
 
         # Set auto-close if specified
         if polltime > 0:
-            config.closetime = timed
+            self.bot.scheduler.schedule(voting.close_key(vote_msg.id), "close_vote", timed)
             logging.info("Vote will close at %s", str(timed))
 
-            await interaction.followup.send(f"Vote started in {cha.mention}!", ephemeral=True)
-
-            # Wait for the timer and then close
-            await discord.utils.sleep_until(timed)
-            logging.info("Closing vote in %s due to poll-time end.", str(cha))
-            await self.endvote_internal("INTERNAL")
-        else:
-            await interaction.followup.send(f"Vote started in {cha.mention}!", ephemeral=True)
+        await interaction.followup.send(f"Vote started in {cha.mention}!", ephemeral=True)
+        phases.finish()
 
     @app_commands.command(name="endvote", description="Ends vote.")
     @app_commands.guild_only()
     @checks.is_operator()
     @checks.vote_running()
-    async def endvote(self, interaction: discord.Interaction) -> None:
+    @app_commands.describe(channel="Channel of the vote, if more than one is running.")
+    async def endvote(self, interaction: discord.Interaction, channel: Optional[discord.TextChannel] = None) -> None:
         """This command is used to end a vote."""
-        await self.endvote_internal(interaction)
+        await self.endvote_internal(interaction, checks.command_vote(interaction, channel))
+
+    @app_commands.command(name="prefetch", description="Shows the download status of the vote candidates.")
+    @checks.is_operator()
+    @checks.vote_running()
+    @app_commands.describe(channel="Channel of the vote, if more than one is running.")
+    async def prefetch_status(self,
+                              interaction: discord.Interaction,
+                              channel: Optional[discord.TextChannel] = None) -> None:
+        """This command is used to check which candidates are already downloaded."""
+        status = self.prefetcher(checks.command_vote(interaction, channel)).status
+        if not status:
+            await interaction.response.send_message("No candidates are being prefetched.", ephemeral=True)
+            return
+        lines = [f"{constants.EMOJI_ALPHABET[i]} - <{url}> - {state}" for i, (url, state) in enumerate(status.items())]
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
 
     @app_commands.command(name="autoclose", description="Sets the autoclose time.")
     @checks.is_operator()
     @checks.vote_running()
-    @app_commands.describe(hours="Hours to close after.", minutes="Minutes to close after.")
-    async def autoclose(self, interaction: discord.Interaction, hours: int = 0, minutes: int = 0) -> None:
+    @app_commands.describe(hours="Hours to close after.",
+                           minutes="Minutes to close after.",
+                           channel="Channel of the vote, if more than one is running.")
+    async def autoclose(self,
+                        interaction: discord.Interaction,
+                        hours: int = 0,
+                        minutes: int = 0,
+                        channel: Optional[discord.TextChannel] = None) -> None:
         """This command is used to set the autoclose time."""
-        config = self.bot.config
+        key = voting.close_key(checks.command_vote(interaction, channel).vote_id)
 
         if hours == 0 and minutes == 0:
-            config.closetime = None
-            await interaction.response.send_message("Attempting Autoclose Abort. Reboot to enforce.", ephemeral=True)
+            if self.bot.scheduler.cancel(key):
+                await interaction.response.send_message("Autoclose aborted.", ephemeral=True)
+            else:
+                await interaction.response.send_message("No autoclose was set.", ephemeral=True)
         else:
             if hours == 99:
                 hours = randint(1, 72)
             if minutes > 59:
                 minutes = randint(0, 59)
             timed = discord.utils.utcnow() + datetime.timedelta(hours=hours, minutes=minutes)
-            config.closetime = timed
+            self.bot.scheduler.schedule(key, "close_vote", timed)
 
             await interaction.response.send_message(
-                f"Vote will close <t:{str(round(config.closetime.timestamp()))}:R>.",
+                f"Vote will close <t:{str(round(timed.timestamp()))}:R>.",
                 ephemeral=True,
             )
-            await discord.utils.sleep_until(timed)
-            if not config.vote_running:
-                logging.info("Vote already closed.")
-                return
-            await self.endvote_internal("INTERNAL")
 
-    async def endvote_internal(self, interaction: Union[discord.Interaction, str]) -> None:
+    async def gather_ballots(self, record: Vote, votemsg: discord.Message, emojis: List[str]) -> reactions.Ballots:
+        """Gets the ballots of a vote, from the live tally when it can be trusted."""
+        live = record.tally
+        if live.matches(votemsg):
+            logging.info("Live tally matches reaction counts, skipping reaction fetch.")
+            return live.ballots(emojis)
+        logging.info("Live tally unusable, fetching all reactions.")
+        return await reactions.collect_voters(votemsg.reactions, emojis, self.bot.config.reaction_concurrency,
+                                              self.bot.user.id)
+
+    async def endvote_internal(self, interaction: Union[discord.Interaction, str], record: Vote) -> None:
         """This command is used to end a vote with advanced features."""
         config = self.bot.config
-        channel = config.channel
-        vote: Dict[str, int] = {}
-        usrlib: Dict[Union[discord.Member, discord.User], Union[int, float]] = {}
-        disregarded: List[Union[discord.Member, discord.User]] = []
-        disreg_votes: Dict[str, List[int]] = {}
-        disreg_total: int = 0
-        disreg_reqs: int = 15
-
-        if not config.vote_running:
+        channel = record.channel
+        usrlib: Dict[int, Union[int, float]] = {}
+        blacklist = set(config.blacklist)
+
+        if not record.running:
             logging.info("Vote already closed.")
             return
 
         # Prevent double closing
-        if self.double_clause:
+        if record.lock.locked():
             logging.info("Double closing attempted.")
             return
-        self.double_clause = True
+        await record.lock.acquire()
+        phases = metrics.stopwatch("endvote")
+        logs.bind(channel=record.channel_id, vote=record.vote_id, phase="endvote")
 
         try:
-            if config.vote_count_mode == 2:
-                disreg_reqs = randint(10, 25)
-            elif config.vote_count_mode == 3:
-                disreg_reqs = 0
+            disreg_reqs = tally.threshold(config.vote_count_mode)
 
-            role = config.mention
+            role = self.mention_role(channel.guild)
 
             if interaction != "INTERNAL":
                 oper = interaction.user
@@ -241,19 +311,18 @@ class VotingCommands(commands.Cog):
                 oper = "system"
 
             await channel.send("Ending vote...", delete_after=60)
-            votemsg = await config.lastvote
+            # Reaction counts have to be current, so the cached message will not do.
+            record.invalidate_message(record.vote_id)
+            votemsg = await record.lastvote
 
             if votemsg is None:
                 raise app_commands.errors.AppCommandError("Vote message not found.")
 
             await votemsg.unpin()
+            phases.lap("setup")
 
             submitted = voting.parse_votemsg(votemsg)
-
-            # Initialize vote dictionaries upfront for all modes
-            for key in constants.EMOJI_ALPHABET[:len(submitted)]:
-                vote[key] = 0
-                disreg_votes[key] = [0] * max(1, disreg_reqs)
+            emojis = constants.EMOJI_ALPHABET[:len(submitted)]
 
             if config.vote_count_mode != 3:
                 await channel.send("Gathering votes and applying fraud protection... (This may take a while)")
@@ -263,99 +332,52 @@ class VotingCommands(commands.Cog):
                     if config.vote_count_mode == 1:
                         logging.info("Using legacy message count mode.")
                         start_time = discord.utils.utcnow()
-                    timed = start_time - datetime.timedelta(days=31)
+                    timed = start_time - constants.HISTORY_WINDOW
 
-                    async for message in channel.history(after=timed, before=start_time, oldest_first=True, limit=None):
-                        usrlib[message.author] = usrlib.get(message.author, 0) + 1
+                    await self.bot.activity_index.sync(channel, timed)
+                    usrlib.update(self.bot.activity_index.counts(channel.id, timed, start_time))
 
                     # Apply democracy™
                     democracy = await config.democracy
                     for user in democracy:
-                        usrlib[user] = float("inf")
+                        usrlib[user.id] = float("inf")
+                    phases.lap("history_scan")
 
                     # Enhanced vote counting with fraud protection
-                    for reaction in votemsg.reactions:
-                        if reaction.emoji in constants.EMOJI_ALPHABET[:len(submitted)]:
-                            async for user in reaction.users():
-                                if user == self.bot.user:
-                                    continue
-
-                                is_blacklisted = user.id in config.blacklist
-                                not_active = user not in usrlib
-
-                                if is_blacklisted or not_active:
-                                    if user not in disregarded:
-                                        disregarded.append(user)
-                                    disreg_total += 1
-                                    continue
-
-                                user_messages = usrlib[user]
-                                if user_messages >= disreg_reqs:
-                                    vote[reaction.emoji] += 1
-                                else:
-                                    if user not in disregarded:
-                                        disregarded.append(user)
-                                    # Cap the index to prevent out-of-bounds just in case
-                                    safe_index = min(int(user_messages), disreg_reqs - 1)
-                                    disreg_votes[reaction.emoji][safe_index] += 1
-                                    disreg_total += 1
+                    ballots = await self.gather_ballots(record, votemsg, emojis)
+                    phases.lap("reaction_fetch")
+                    voters, choices = tally.pairs(ballots.voters, emojis)
+                    counted = tally.count(voters, choices, len(emojis), blacklist, usrlib, disreg_reqs)
+                    phases.lap("tally")
             else:
                 # Mode 3: Bypass history scan and fraud protection, count standard votes directly
                 await channel.send("Gathering votes... (Bypassing fraud protection)")
                 async with channel.typing():
-                    for reaction in votemsg.reactions:
-                        if reaction.emoji in constants.EMOJI_ALPHABET[:len(submitted)]:
-                            async for user in reaction.users():
-                                if user == self.bot.user:
-                                    continue
-                                # Maintain basic blacklist check
-                                if user.id in config.blacklist:
-                                    if user not in disregarded:
-                                        disregarded.append(user)
-                                    disreg_total += 1
-                                    continue
-                                vote[reaction.emoji] += 1
+                    ballots = await self.gather_ballots(record, votemsg, emojis)
+                    phases.lap("reaction_fetch")
+                    # Maintain basic blacklist check
+                    voters, choices = tally.pairs(ballots.voters, emojis)
+                    counted = tally.count(voters, choices, len(emojis), blacklist)
+                    phases.lap("tally")
+
+            vote = dict(zip(emojis, counted.votes))
+            disreg_votes = dict(zip(emojis, counted.histogram))
 
             # Create a result message
-            msg_text = "This week's featured results are:\n"
-            for key in constants.EMOJI_ALPHABET[:len(submitted)]:
-                msg_text += f"{key} - {vote[key]} vote{voting.plurls(vote[key])}\n"
-
-            results_embed = discord.Embed(title="RESULTS", description=msg_text, color=0x00FF00)
-            await channel.send(embed=results_embed, reference=votemsg, mention_author=False)
-
-            # Advanced tie resolution
-            max_vote = max(vote.values()) if vote else 0
-            win_candidates = [k for k, v in vote.items() if v == max_vote]
-            win_id = None
-            tiebreak = 0
-
-            # Advanced tiebreaking logic (Skipped completely in Mode 3)
-            if len(win_candidates) > 1 and config.vote_count_mode != 3:
-                for i in range(disreg_reqs - 1, -1, -1):
-                    lvl_vals = {c: disreg_votes[c][i] for c in win_candidates}
-                    cap = max(lvl_vals.values()) if lvl_vals else 0
-                    win_candidates = [c for c, v in lvl_vals.items() if v == cap]
-
-                    if len(win_candidates) == 1:
-                        win_id = win_candidates[0]
-                        tiebreak = 1
-                        break
-            elif len(win_candidates) == 1:
-                win_id = win_candidates[0]
-
-            # If still tied, random selection
-            if win_id is None:
-                tiebreak = 2
-                win_id = choice(win_candidates)
+            await reports.send(channel, reports.results(emojis, vote), reference=votemsg, mention_author=False)
+            phases.lap("results")
+
+            # Advanced tie resolution (Skipped completely in Mode 3)
+            resolution = tally.resolve(counted, cascade=config.vote_count_mode != 3)
+            win_id = emojis[resolution.winner]
+            win_candidates = [emojis[candidate] for candidate in resolution.tied]
+            tiebreak = resolution.rule
 
             # Debug tie functionality for manual override
             if tiebreak and config.debug_tie:
                 await channel.send("Stand by for Stalemate Resolution.")
-                app_info = await self.bot.application_info()
-                owner = app_info.owner
-                if app_info.team:
-                    owner = choice(app_info.team.members)
+                owner_id = choice(sorted(self.bot.auth.owners))
+                owner = self.bot.get_user(owner_id) or await self.bot.fetch_user(owner_id)
                 dm_channel = owner.dm_channel
                 if dm_channel is None:
                     dm_channel = await owner.create_dm()
@@ -402,41 +424,41 @@ class VotingCommands(commands.Cog):
                     await dm_channel.send("Thank You. This concludes the Stalemate Resolution.")
                 except asyncio.TimeoutError:
                     await dm_channel.send("Resolution timed out. Proceeding with automatic winner.")
+            phases.lap("tiebreak")
 
             # Fraud protection report
-            if disregarded:
-                fraport_text = (f"Total disregarded votes: {disreg_total}\n" +
-                                f"Total disregarded users: {len(disregarded)}\n" + "Disregarded users:\n")
-                for usr in disregarded:
-                    if usr in usrlib:
-                        fraport_text += f"{usr.mention} - {usrlib[usr]} message{voting.plurls(usrlib[usr])}\n"
-                    elif usr.id in config.blacklist:
-                        fraport_text += f"{usr.mention} - Blacklisted\n"
-                    else:
-                        fraport_text += f"{usr.mention} - 0 messages\n"
-                fraprot = discord.Embed(title="Fraud Protection Log", description=fraport_text, color=0xFC0303)
-                fraprot.set_footer(text="This is a public safety announcement.")
-            else:
-                fraprot = discord.Embed(
-                    title="Fraud Protection Log",
-                    description="No users were disregarded.",
-                    color=0x00FFF7,
-                )
-                fraprot.set_footer(text="Thank you for your cooperation.")
-
-            await channel.send(embed=fraprot)
+            fraprot, fraud_log = reports.fraud(counted, usrlib)
+            await reports.send(channel, fraprot, fraud_log)
+            phases.lap("report")
 
             # Try to download winner's file
             try:
                 winner_url = submitted[constants.EMOJI_ALPHABET.index(win_id)][0]
-                downed = await asyncio.wait_for(downloaders.fetch_download(winner_url), timeout=1200)
+                prefetcher = self.prefetcher(record)
+                try:
+                    prefetched = prefetcher.take(winner_url)
+                    if prefetched is None:
+                        # Joins the winner's prefetch if it is still running, ahead of everything else.
+                        await self.bot.downloads.load()
+                        job = self.bot.downloads.submit(winner_url)
+                        try:
+                            prefetched = await asyncio.wait_for(self.bot.downloads.wait(job), timeout=1200)
+                        finally:
+                            self.bot.downloads.release(job)
+                    else:
+                        logging.info("Using prefetched download of %s.", winner_url)
+                finally:
+                    prefetcher.finish(keep=winner_url)
+                downed = await epub.fit_upload(prefetched[0], prefetched[1], channel.guild.filesize_limit)
             except Exception as e:  # pylint: disable=broad-exception-caught
                 logging.warning("Failed to download winner. %s Error Stack:\n", e, exc_info=True)
                 downed = None
+            phases.lap("download")
 
             # Create winner announcement
             winner_submitters = submitted[constants.EMOJI_ALPHABET.index(win_id)][1]
-            message_txt = (f"{role.mention} This week's featured results are in!\n" + f"The winner is {winner_url}" +
+            mention_text = role.mention if role else ""
+            message_txt = (f"{mention_text} This week's featured results are in!\n" + f"The winner is {winner_url}" +
                            f" submitted by {winner_submitters}" +
                            f" with {vote[win_id]} vote{voting.plurls(vote[win_id])}!")
 
@@ -451,23 +473,31 @@ class VotingCommands(commands.Cog):
                 message_txt += "\n\nThe winner's epub could not be downloaded."
                 message = await channel.send(message_txt)
             else:
-                message = await channel.send(message_txt, file=downed)
+                message = await channel.send(message_txt, file=downed[0])
 
             await message.add_reaction("🎉")
             await message.pin()
+            # Stories split into volumes get the remaining ones as replies.
+            for volume in (downed or [])[1:]:
+                await message.reply(file=volume, mention_author=False)
+            phases.lap("upload")
 
             # Update configuration
-            config.lastwin = message
-            config.vote_running = False
-            config.closetime = None
+            record.tally.stop()
+            record.lastwin = message
+            self.bot.scheduler.cancel(voting.close_key(votemsg.id))
+            record.results = {"winner": winner_url, "votes": vote, "closed": discord.utils.utcnow().timestamp()}
+            record.running = False
+            config.flush()
 
             if interaction != "INTERNAL":
                 await interaction.followup.send("Vote ended.", ephemeral=True)
 
             logging.info("Vote ended by %s. Winner: %s", oper, winner_url)
+            phases.finish()
 
         finally:
-            self.double_clause = False
+            record.lock.release()
 
 
 async def setup(bot):
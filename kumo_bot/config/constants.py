@@ -4,11 +4,13 @@ This file stores static variables that are used throughout the bot.
 This is to keep the code clean and easy to read.
 Following the Tickets-Plus pattern for constant organization.
 """
-from logging.handlers import RotatingFileHandler
+import datetime
 import pathlib
 
 import discord
 
+from kumo_bot.utils import logs
+
 # Bot version
 VERSION = "v1.3.0.0a3"
 
@@ -42,7 +44,27 @@ EMOJI_ALPHABET = [
     "\U0001F1FF",  # 🇿
 ]
 
-# Discord intents configuration
+# How far back message activity and submissions are considered
+HISTORY_WINDOW = datetime.timedelta(days=31)
+
+# Download cache bounds: total size in bytes and seconds before re-checking a story for updates
+DOWNLOAD_CACHE_BYTES = 512 * 1024 * 1024
+DOWNLOAD_PROBE_TTL = 3600
+
+# Number of FanFicFare worker threads, and how many of them may prefetch vote candidates
+DOWNLOAD_WORKERS = 2
+PREFETCH_CONCURRENCY = 1
+
+# Pending downloads allowed per user
+DOWNLOAD_USER_LIMIT = 2
+
+# Concurrent fetches per fiction site, seconds a failing site is skipped before it is tried again,
+# and seconds a single fetch may take before it counts as a failure
+HOST_CONCURRENCY = 1
+HOST_COOLDOWN = 600
+HOST_TIMEOUT = 600
+
+# Discord intents of the setup bot, the main bot takes its own from the deployment profile
 intents = discord.Intents.default()
 intents.message_content = True
 intents.messages = True
@@ -51,12 +73,19 @@ intents.messages = True
 directory = pathlib.Path(__file__).parent.parent.parent
 ldir = directory / "logs"
 ldir.mkdir(parents=True, exist_ok=True)
+ddir = directory / "data"
+ddir.mkdir(parents=True, exist_ok=True)
+
+# Log file rotation: size in bytes, seconds each file covers and rotated files kept
+LOG_BYTES = 5 * 1024 * 1024
+LOG_INTERVAL = 24 * 60 * 60
+LOG_BACKUPS = 10
+
+# Log file writer, only ever called from the logging thread
+log_file = ldir / "discord.log"
+file_handler = logs.RotatingHandler(log_file, LOG_BYTES, LOG_INTERVAL, LOG_BACKUPS)
+file_handler.setFormatter(logs.TEXT)
 
-# Default logging handler
-handler = RotatingFileHandler(
-    filename=ldir / "discord.log",
-    encoding="utf-8",
-    mode="w",
-    backupCount=10,
-    maxBytes=100000,
-)
+# Default logging handler, queueing records so the event loop never waits on the disk.
+# Nothing is written before ``logs.install`` starts its thread.
+handler = logs.QueuedHandler(file_handler)
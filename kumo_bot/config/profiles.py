@@ -0,0 +1,79 @@
+"""Deployment profiles: how much gateway state the bot subscribes to and keeps.
+
+The bot works in one guild and reads one channel, and every event it tracks
+arrives as a raw event or an interaction. The small profile drops the
+intents and caches that serves no purpose then, for running in a small
+container. Profiles are picked with the ``profile`` key of config.json and
+apply from the next start.
+"""
+import dataclasses
+import logging
+from typing import Any, Callable, Dict, Optional
+
+import discord
+
+DEFAULT = "standard"
+
+
+@dataclasses.dataclass
+class Profile:
+    """Gateway subscriptions and caches of a deployment.
+
+    Attributes:
+        name: Name of the profile in config.json.
+        intents: Gateway events subscribed to.
+        max_messages: Messages kept in the message cache, None disables it.
+        member_cache_flags: Which members are cached.
+        chunk_guilds_at_startup: Whether every guild's member list is
+            downloaded on connect.
+    """
+    name: str
+    intents: discord.Intents
+    max_messages: Optional[int]
+    member_cache_flags: discord.MemberCacheFlags
+    chunk_guilds_at_startup: bool
+
+    def options(self) -> Dict[str, Any]:
+        """The profile as keyword arguments of the bot."""
+        return {
+            "intents": self.intents,
+            "max_messages": self.max_messages,
+            "member_cache_flags": self.member_cache_flags,
+            "chunk_guilds_at_startup": self.chunk_guilds_at_startup,
+        }
+
+
+def standard() -> Profile:
+    """discord.py's defaults with message content, as the bot always ran."""
+    intents = discord.Intents.default()
+    intents.message_content = True
+    return Profile(DEFAULT, intents, 1000, discord.MemberCacheFlags.from_intents(intents), intents.members)
+
+
+def small() -> Profile:
+    """Only the events the bot handles, with no message or member cache.
+
+    Guild messages feed the local indexes and mention commands, reactions
+    the live tally, and direct messages the owner's ``sync`` command.
+    """
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.guild_reactions = True
+    intents.dm_messages = True
+    intents.message_content = True
+    return Profile("small", intents, None, discord.MemberCacheFlags.none(), False)
+
+
+PROFILES: Dict[str, Callable[[], Profile]] = {
+    "standard": standard,
+    "small": small,
+}
+
+
+def get(name: str) -> Profile:
+    """The profile of a name, the default one if it is unknown."""
+    if name not in PROFILES:
+        logging.warning("Unknown deployment profile %r, using %s.", name, DEFAULT)
+        name = DEFAULT
+    return PROFILES[name]()
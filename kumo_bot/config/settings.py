@@ -3,13 +3,41 @@
 This module contains the Secret and Config classes for managing
 bot configuration and secrets, following the Tickets-Plus pattern.
 """
+import asyncio
+import copy
 import json
+import os
+import logging
+import threading
+import time
 from datetime import datetime, timezone
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import discord
 from discord.ext import commands
 
+from kumo_bot.config import votes
+
+# Seconds to wait for further changes before writing config.json
+WRITE_DELAY = 0.5
+
+# Seconds resolved members are reused for
+MEMBER_TTL = 600
+
+
+def write_json(path: str, data: dict) -> None:
+    """Atomically replaces a JSON file.
+
+    The data is written to a temporary file first and moved over the target,
+    so a crash never leaves a truncated file behind.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, encoding="utf-8", mode="w") as tmp_f:
+        json.dump(data, tmp_f, indent=4)
+        tmp_f.flush()
+        os.fsync(tmp_f.fileno())
+    os.replace(tmp, path)
+
 
 class Secret:
     """Class for secret.json management"""
@@ -32,10 +60,20 @@ class Config:
 
     def __init__(self, bot: commands.Bot) -> None:
         self._file = "config.json"
-        self.armed = False
         with open(self._file, encoding="utf-8") as config_f:
             self._config = json.load(config_f)
         self._bt = bot
+        self._pending: Optional[asyncio.TimerHandle] = None
+        self._write_lock = threading.Lock()
+        self._version = 0
+        self._written = 0
+        self._members: Dict[int, Tuple[float, discord.Member]] = {}
+        self.member_hits = 0
+        self.member_misses = 0
+        had_votes = "votes" in self._config
+        self.votes = votes.VoteStore(bot, votes.migrate(self._config), self.update)
+        if not had_votes:
+            self.flush()
 
     def __dict__(self) -> dict:
         return self._config
@@ -49,10 +87,63 @@ class Config:
         self._config[key] = value
 
     def update(self) -> None:
-        """Update the config.json file to reflect changes"""
-        with open(self._file, encoding="utf-8", mode="w") as config_f:
-            json.dump(self._config, config_f, indent=4)
-            config_f.truncate()
+        """Schedule the config.json file to be updated to reflect changes
+
+        Changes made within WRITE_DELAY of each other are written together,
+        off the event loop. Without a running loop the file is written at once.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._version += 1
+        if self._pending is None:
+            self._pending = loop.call_later(WRITE_DELAY, self._write_behind, loop)
+
+    def _write_behind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._pending = None
+        future = loop.run_in_executor(None, self._write, copy.deepcopy(self._config), self._version)
+        future.add_done_callback(self._written_behind)
+
+    @staticmethod
+    def _written_behind(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logging.error("Could not write config.json.", exc_info=future.exception())
+
+    def _write(self, data: dict, version: int) -> None:
+        with self._write_lock:
+            if version < self._written:
+                return
+            write_json(self._file, data)
+            self._written = version
+
+    def flush(self) -> None:
+        """Write pending changes to config.json right away"""
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        self._version += 1
+        self._write(copy.deepcopy(self._config), self._version)
+
+    # RESOLVED OBJECT CACHE
+
+    def invalidate_member(self, member_id: int) -> None:
+        """Drops a cached member after it changed"""
+        self._members.pop(member_id, None)
+
+    async def _query_members(self, guild: discord.Guild, ids: List[int]) -> List[discord.Member]:
+        """Resolves members over the gateway in batches, falling back to REST"""
+        found: List[discord.Member] = []
+        for start in range(0, len(ids), 100):
+            chunk = ids[start:start + 100]
+            try:
+                found.extend(await guild.query_members(user_ids=chunk, limit=len(chunk), cache=True))
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                logging.warning("Member query failed, fetching members one by one: %s", e)
+                results = await asyncio.gather(*(guild.fetch_member(id_) for id_ in chunk), return_exceptions=True)
+                found.extend(member for member in results if isinstance(member, discord.Member))
+        return found
 
     # GETTERS AND SETTERS FOLLOW
 
@@ -137,59 +228,19 @@ class Config:
         self._config["mention"] = role.id
         self.update()
 
-    @property
-    async def lastvote(self) -> Optional[discord.Message]:
-        """Gets last vote's message from config"""
-        if self._config.get("lastvote", None) is None:
-            return None
-        tmp = await self.channel.fetch_message(self._config["lastvote"])
-        if tmp is None:
-            raise ValueError("Message not found")
-        return tmp
-
-    @lastvote.setter
-    def lastvote(self, msg: discord.Message) -> None:
-        self._config["lastvote"] = msg.id
-        self.update()
-
-    @property
-    async def lastwin(self) -> Optional[discord.Message]:
-        """Gets last win's message from config"""
-        if self._config.get("lastwin", None) is None:
-            return None
-        tmp = await self.channel.fetch_message(self._config["lastwin"])
-        if tmp is None:
-            raise ValueError("Message not found")
-        return tmp
-
-    @lastwin.setter
-    def lastwin(self, msg: discord.Message) -> None:
-        self._config["lastwin"] = msg.id
-        self.update()
-
     @property
     def closetime(self) -> Optional[datetime]:
-        """Gets time to close the running vote on"""
+        """Gets time to close the running vote on, only read to migrate it to the scheduler"""
         if self._config.get("closetime", None) is None:
             return None
         return datetime.fromtimestamp(self._config["closetime"], tz=timezone.utc)
 
     @closetime.setter
-    def closetime(self, time: Optional[datetime]) -> None:
-        if time is None:
+    def closetime(self, close_time: Optional[datetime]) -> None:
+        if close_time is None:
             self._config["closetime"] = None
         else:
-            self._config["closetime"] = time.timestamp()
-        self.update()
-
-    @property
-    def vote_running(self) -> bool:
-        """Checks if a vote is running"""
-        return self._config.get("voterunning", False)
-
-    @vote_running.setter
-    def vote_running(self, running: bool) -> None:
-        self._config["voterunning"] = running
+            self._config["closetime"] = close_time.timestamp()
         self.update()
 
     @property
@@ -218,21 +269,73 @@ class Config:
         self._config["vote_count_mode"] = mode
         self.update()
 
+    @property
+    def reaction_concurrency(self) -> int:
+        """Gets how many vote reactions are fetched at once"""
+        return self._config.get("reaction_concurrency", 4)
+
+    @reaction_concurrency.setter
+    def reaction_concurrency(self, concurrency: int) -> None:
+        self._config["reaction_concurrency"] = concurrency
+        self.update()
+
     @property
     async def democracy(self) -> list[discord.Member] | list:
         """Get democracy-privileged users"""
-        try:
-            ids: list[int] = self._config["democracy"]
-            democracy_members = []
-            for id_ in ids:
-                member = self.guild.get_member(id_)
-                if member is None:
-                    democracy_members.append(await self.guild.fetch_member(id_))
-                elif isinstance(member, discord.Member):
-                    democracy_members.append(member)
-            return democracy_members
-        except KeyError:
+        ids: list[int] = self._config.get("democracy", [])
+        if not ids:
             return []
+        guild = self.guild
+        now = time.monotonic()
+        democracy_members = []
+        missing = []
+        for id_ in ids:
+            cached = self._members.get(id_)
+            if cached is not None and now - cached[0] < MEMBER_TTL:
+                member = cached[1]
+            else:
+                member = guild.get_member(id_)
+                if member is not None:
+                    self._members[id_] = (now, member)
+            if isinstance(member, discord.Member):
+                self.member_hits += 1
+                democracy_members.append(member)
+            else:
+                self.member_misses += 1
+                missing.append(id_)
+        if missing:
+            fetched = await self._query_members(guild, missing)
+            for member in fetched:
+                self._members[member.id] = (now, member)
+            democracy_members.extend(fetched)
+            if len(fetched) < len(missing):
+                logging.warning("%d democracy users could not be resolved.", len(missing) - len(fetched))
+        return democracy_members
+
+    @property
+    def profile(self) -> str:
+        """Gets the deployment profile, applied from the next start"""
+        return self._config.get("profile", "standard")
+
+    @profile.setter
+    def profile(self, profile: str) -> None:
+        self._config["profile"] = profile
+        self.update()
+
+    @property
+    def cached_members(self) -> int:
+        """Gets the number of resolved members kept"""
+        return len(self._members)
+
+    @property
+    def log_format(self) -> str:
+        """Gets the log file format, text or json, applied from the next start"""
+        return self._config.get("log_format", "text")
+
+    @property
+    def metrics_port(self) -> int:
+        """Gets the local port metrics are served on, 0 disables the endpoint"""
+        return self._config.get("metrics_port", 9108)
 
     @property
     def debug_tie(self) -> bool:
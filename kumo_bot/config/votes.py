@@ -0,0 +1,214 @@
+"""Per-channel vote state for KumoFeaturedBot.
+
+Every channel votes are held in gets its own record under ``votes`` in
+config.json: its last vote and win messages, whether a vote is running and
+the results of the last close. Records carry their own lock and live tally,
+so votes in different channels and guilds run and close independently.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+import discord
+from discord.ext import commands
+
+from kumo_bot.config.constants import ddir
+from kumo_bot.utils.live_tally import LiveTally
+
+
+class Vote:
+    """The vote state of a single channel.
+
+    Attributes:
+        channel_id: Id of the channel votes are posted in.
+        lock: Held while the vote is being closed.
+        tally: Live tally of the running vote.
+    """
+
+    def __init__(self, bot: commands.Bot, channel_id: int, data: dict, update: Callable[[], None]) -> None:
+        self._bt = bot
+        self._data = data
+        self._update = update
+        self._messages: Dict[str, discord.Message] = {}
+        self.channel_id = channel_id
+        self.lock = asyncio.Lock()
+        self.tally = LiveTally(ddir / f"tally-{channel_id}.json")
+
+    async def _resolve_message(self, key: str) -> Optional[discord.Message]:
+        """Gets a recorded message, fetching it only if it is not cached"""
+        msg_id = self._data.get(key, None)
+        if msg_id is None:
+            return None
+        cached = self._messages.get(key)
+        if cached is not None and cached.id == msg_id:
+            return cached
+        tmp = await self.channel.fetch_message(msg_id)
+        self._messages[key] = tmp
+        return tmp
+
+    def invalidate_message(self, message_id: Optional[int] = None) -> None:
+        """Drops a cached message after it changed, or all of them"""
+        for key, msg in list(self._messages.items()):
+            if message_id is None or msg.id == message_id:
+                del self._messages[key]
+
+    @property
+    def guild_id(self) -> Optional[int]:
+        """Gets the id of the vote's guild"""
+        return self._data.get("guild")
+
+    @property
+    def channel(self) -> Union[discord.TextChannel, discord.Thread]:
+        """Gets the vote channel"""
+        tmp = self._bt.get_channel(self.channel_id)
+        if tmp is None:
+            raise ValueError("Channel not found")
+        if isinstance(tmp, (discord.TextChannel, discord.Thread)):
+            return tmp
+        raise ValueError("Channel is not a text channel or thread")
+
+    @property
+    def vote_id(self) -> Optional[int]:
+        """Gets the id of the last vote message"""
+        return self._data.get("lastvote")
+
+    @property
+    def win_id(self) -> Optional[int]:
+        """Gets the id of the last win message"""
+        return self._data.get("lastwin")
+
+    @property
+    async def lastvote(self) -> Optional[discord.Message]:
+        """Gets the last vote message"""
+        return await self._resolve_message("lastvote")
+
+    @lastvote.setter
+    def lastvote(self, msg: discord.Message) -> None:
+        self._data["lastvote"] = msg.id
+        self._messages["lastvote"] = msg
+        self._update()
+
+    @property
+    async def lastwin(self) -> Optional[discord.Message]:
+        """Gets the last win message"""
+        return await self._resolve_message("lastwin")
+
+    @lastwin.setter
+    def lastwin(self, msg: discord.Message) -> None:
+        self._data["lastwin"] = msg.id
+        self._messages["lastwin"] = msg
+        self._update()
+
+    @property
+    def running(self) -> bool:
+        """Checks if a vote is running"""
+        return self._data.get("running", False)
+
+    @running.setter
+    def running(self, running: bool) -> None:
+        self._data["running"] = running
+        self._update()
+
+    @property
+    def results(self) -> Optional[dict]:
+        """Gets the results of the last close: winner url, vote counts and close time"""
+        return self._data.get("results")
+
+    @results.setter
+    def results(self, results: dict) -> None:
+        self._data["results"] = results
+        self._update()
+
+
+class VoteStore:
+    """All vote records, keyed by vote channel.
+
+    Args:
+        bot: The bot, used to resolve channels.
+        data: The ``votes`` section of the config, changed in place.
+        update: Schedules the config to be written.
+    """
+
+    def __init__(self, bot: commands.Bot, data: Dict[str, dict], update: Callable[[], None]) -> None:
+        self._bt = bot
+        self._data = data
+        self._update = update
+        self._votes: Dict[int, Vote] = {
+            int(channel_id): Vote(bot, int(channel_id), record, update) for channel_id, record in data.items()
+        }
+
+    def __iter__(self) -> Iterator[Vote]:
+        return iter(self._votes.values())
+
+    def __len__(self) -> int:
+        return len(self._votes)
+
+    def get(self, channel_id: int) -> Optional[Vote]:
+        """Gets the vote record of a channel"""
+        return self._votes.get(channel_id)
+
+    def open(self, channel: Union[discord.TextChannel, discord.Thread]) -> Vote:
+        """Gets the vote record of a channel, creating it if needed"""
+        vote = self._votes.get(channel.id)
+        if vote is None:
+            record = {"guild": channel.guild.id, "lastvote": None, "lastwin": None, "running": False}
+            self._data[str(channel.id)] = record
+            vote = Vote(self._bt, channel.id, record, self._update)
+            self._votes[channel.id] = vote
+            self._update()
+        return vote
+
+    def running(self) -> List[Vote]:
+        """Gets all running votes"""
+        return [vote for vote in self._votes.values() if vote.running]
+
+    def by_message(self, message_id: int) -> Optional[Vote]:
+        """Gets the vote whose last vote message has an id"""
+        for vote in self._votes.values():
+            if vote.vote_id == message_id:
+                return vote
+        return None
+
+    def resolve(self, channel_id: Optional[int], guild_id: Optional[int] = None) -> Optional[Vote]:
+        """Finds the running vote a command refers to.
+
+        That is the running vote of the channel, or with a guild given, the
+        only running vote of that guild.
+        """
+        vote = self._votes.get(channel_id)
+        if vote is not None and vote.running:
+            return vote
+        if guild_id is None:
+            return None
+        in_guild = [vote for vote in self.running() if vote.guild_id == guild_id]
+        return in_guild[0] if len(in_guild) == 1 else None
+
+    def invalidate_message(self, message_id: Optional[int] = None) -> None:
+        """Drops a cached message from every record"""
+        for vote in self._votes.values():
+            vote.invalidate_message(message_id)
+
+
+def migrate(config: dict) -> Dict[str, dict]:
+    """Moves the single vote of older configs into a vote record.
+
+    Returns:
+        The ``votes`` section of the config.
+    """
+    if "votes" in config:
+        return config["votes"]
+    votes: Dict[str, dict] = {}
+    lastvote = config.pop("lastvote", None)
+    lastwin = config.pop("lastwin", None)
+    running = config.pop("voterunning", False)
+    channel_id = config.get("channel")
+    if channel_id is not None:
+        votes[str(channel_id)] = {
+            "guild": config.get("guild"),
+            "lastvote": lastvote,
+            "lastwin": lastwin,
+            "running": running,
+        }
+        logging.info("Migrated the vote of channel %s to the vote store.", channel_id)
+    config["votes"] = votes
+    return votes
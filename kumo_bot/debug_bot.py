@@ -1,24 +1,23 @@
 """Debug bot class that extends the main bot with debug features."""
 import asyncio
-import datetime
 import logging
 import os
-import re
+from typing import Optional
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
 from kumo_bot.bot import KumoBot
-from kumo_bot.utils import checks
-from kumo_bot.config.constants import VERSION, handler, EMOJI_ALPHABET
+from kumo_bot.utils import checks, logs, metrics
+from kumo_bot.config.constants import HISTORY_WINDOW, VERSION, handler, EMOJI_ALPHABET
 
 
 class DebugBot(KumoBot):
     """Debug version of the bot with additional debug commands."""
 
-    def __init__(self):
-        super().__init__(True, ">")
+    def __init__(self, startup: Optional[metrics.Stopwatch] = None):
+        super().__init__(True, ">", startup)
 
         # Override activity for debug mode
         self.activity = discord.Activity(type=discord.ActivityType.playing, name="with fire. [DEBUG MODE]")
@@ -53,16 +52,15 @@ class DebugBot(KumoBot):
         if command == "testget":
             # Test submission gathering functionality
             submitted = []
-            submitees = []
+            submitees = set()
             await ctx.send("Gathering submissions...", delete_after=10)
             async with ctx.typing():
-                timed = discord.utils.utcnow() - datetime.timedelta(days=31)
-                async for message in ctx.history(after=timed, limit=None):
-                    if (message.content.startswith("https://") and message.author not in submitees):
-                        url = re.search(r"(?P<url>https?://\S+)", message.content)
-                        if url not in submitted and url is not None:
-                            submitted.append(str(url.group("url")))
-                            submitees.append(message.author)
+                timed = discord.utils.utcnow() - HISTORY_WINDOW
+                await self.submissions.sync(ctx.channel, timed)
+                for entry in self.submissions.entries(ctx.channel.id, timed):
+                    if entry.author_id not in submitees:
+                        submitted.append(entry.url)
+                        submitees.add(entry.author_id)
             submitted = list(dict.fromkeys(submitted))
             await ctx.author.send(f"Found {len(submitted)} submissions:\n" + "\n".join(submitted[:10])
                                  )  # Limit to first 10
@@ -71,18 +69,16 @@ class DebugBot(KumoBot):
         elif command in ["testhistory", "testhist"]:
             # Test vote history and user activity analysis
             async with ctx.typing():
-                usrlib = {}
                 vote = {}
                 channel = config.channel
-                votemsg = await config.lastvote
-                timed = discord.utils.utcnow() - datetime.timedelta(days=31)
+                record = config.votes.get(channel.id)
+                votemsg = await record.lastvote if record is not None else None
+                now = discord.utils.utcnow()
+                timed = now - HISTORY_WINDOW
 
                 # Count user activity
-                async for message in channel.history(after=timed, limit=None):
-                    if message.author not in usrlib:
-                        usrlib[message.author] = 1
-                    else:
-                        usrlib[message.author] += 1
+                await self.activity_index.sync(channel, timed)
+                usrlib = self.activity_index.counts(channel.id, timed, now)
 
                 # Analyze last vote if exists
                 if votemsg:
@@ -90,9 +86,9 @@ class DebugBot(KumoBot):
                         if reaction.emoji in EMOJI_ALPHABET:
                             vote[reaction.emoji] = 0
                             async for user in reaction.users():
-                                if user != self.user and user in usrlib:
+                                if user != self.user and user.id in usrlib:
                                     # Check if user meets activity threshold
-                                    if usrlib[user] >= 5:
+                                    if usrlib[user.id] >= 5:
                                         vote[reaction.emoji] += 1
                 else:
                     vote = "No vote message found."
@@ -113,7 +109,7 @@ class DebugBot(KumoBot):
             parts = command.split(" ", 2)
             if len(parts) < 3:
                 await ctx.send("Usage: `set <property> <value>`\n"
-                               "Available properties: mode, debug_tie, vote_count_mode")
+                               "Available properties: mode, debug_tie, vote_count_mode, reaction_concurrency")
                 return
 
             _, prop, value = parts
@@ -130,6 +126,12 @@ class DebugBot(KumoBot):
                     await ctx.send(f"Vote count mode set to: {value}")
                 except ValueError:
                     await ctx.send("Vote count mode must be a number (0-2)")
+            elif prop == "reaction_concurrency":
+                try:
+                    config.reaction_concurrency = int(value)
+                    await ctx.send(f"Reaction concurrency set to: {value}")
+                except ValueError:
+                    await ctx.send("Reaction concurrency must be a number")
             else:
                 await ctx.send(f"Unknown property: {prop}")
 
@@ -214,4 +216,5 @@ class DebugBot(KumoBot):
 
     def run_bot(self):
         """Run the debug bot."""
-        self.run(self.secret.token, log_handler=handler, log_level=logging.DEBUG, root_logger=True)
+        logs.install(handler, logging.DEBUG)
+        self.run(self.secret.token, log_handler=None)
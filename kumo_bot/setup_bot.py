@@ -1,12 +1,12 @@
 """Setup bot class for initial configuration."""
-import json
 import logging
 from typing import Any, Dict
 
 from discord.ext import commands
 
 from kumo_bot.config.constants import VERSION, handler, intents
-from kumo_bot.config.settings import Secret
+from kumo_bot.config.settings import Secret, write_json
+from kumo_bot.utils import logs
 
 
 class SetupBot(commands.Bot):
@@ -112,18 +112,13 @@ class SetupBot(commands.Bot):
             # Finalize setup
             await dm_channel.send("Preparing to save configuration...")
             confi["mention"] = None
-            confi["lastvote"] = None
-            confi["lastwin"] = None
-            confi["closetime"] = None
-            confi["voterunning"] = False
+            confi["votes"] = {}
             confi["blacklist"] = []
             confi["vote_count_mode"] = 0
             confi["debug_tie"] = False
             confi["owner_role"] = "Administrator"
 
-            with open("config.json", "w+", encoding="utf-8") as config_file:
-                json.dump(confi, config_file, indent=4)
-                config_file.truncate()
+            write_json("config.json", confi)
 
             await dm_channel.send("Configuration saved. Setup complete.")
             await ctx.send("Setup complete. Restarting...")
@@ -131,4 +126,5 @@ class SetupBot(commands.Bot):
 
     def run_bot(self):
         """Run the setup bot."""
-        self.run(self.secret.token, log_handler=handler, root_logger=True)
+        logs.install(handler)
+        self.run(self.secret.token, log_handler=None)
@@ -0,0 +1,228 @@
+"""Vote counting and stalemate resolution, independent of Discord.
+
+Votes come in as two parallel arrays, one entry per (voter, candidate) pair,
+with candidates as their position on the ballot. Eligibility is worked out
+once per voter with set operations, then the pairs are counted in a single
+pass each for the totals and the tiebreak histogram.
+
+Run ``python -m kumo_bot.tally fixture.jsonl.gz`` to count a recorded vote.
+"""
+import argparse
+import array
+import collections
+import dataclasses
+import gzip
+import json
+import random
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+# Why the votes of a voter were not counted
+BLACKLISTED = "blacklisted"
+INACTIVE = "inactive"
+LOW_ACTIVITY = "low activity"
+
+# Stalemate resolution rules, as shown in the winner announcement
+NO_TIE = 0
+RULE_DISREGARDED = 1
+RULE_RANDOM = 2
+RULE_ASSOCIATE = 3
+
+
+@dataclasses.dataclass
+class Tally:
+    """The counted vote.
+
+    Attributes:
+        votes: Counted votes per candidate.
+        disregarded: Voters whose votes were not counted, mapped to the
+            reason, in ballot order.
+        disregarded_votes: Number of votes not counted.
+        histogram: Disregarded low activity votes per candidate and number
+            of messages the voter sent, capped at the threshold.
+    """
+    votes: List[int]
+    disregarded: Dict[int, str]
+    disregarded_votes: int
+    histogram: List[List[int]]
+
+
+@dataclasses.dataclass
+class Resolution:
+    """The winner of a vote and how it was picked.
+
+    Attributes:
+        winner: Position of the winning candidate.
+        rule: The stalemate resolution rule used, ``NO_TIE`` if there was
+            a clear winner.
+        tied: The candidates still tied when the resolution stopped.
+        cascade: Histogram levels tried, highest first, with the
+            candidates left after each.
+    """
+    winner: int
+    rule: int
+    tied: List[int]
+    cascade: List[Tuple[int, List[int]]] = dataclasses.field(default_factory=list)
+
+
+def threshold(mode: int, rng: Optional[random.Random] = None) -> int:
+    """Messages a voter needs for their votes to count in a vote count mode.
+
+    Mode 2 draws it at random for every vote, mode 3 has no fraud protection.
+    """
+    if mode == 2:
+        return (rng or random).randint(10, 25)
+    if mode == 3:
+        return 0
+    return 15
+
+
+def pairs(ballots: Mapping[int, Sequence[str]], emojis: Sequence[str]) -> Tuple[array.array, array.array]:
+    """Flattens ballots of emojis into voter and candidate arrays."""
+    position = {emoji: i for i, emoji in enumerate(emojis)}
+    voters = array.array("q")
+    choices = array.array("B")
+    for voter, chosen in ballots.items():
+        for emoji in chosen:
+            voters.append(voter)
+            choices.append(position[emoji])
+    return voters, choices
+
+
+def count(voters: Sequence[int],
+          choices: Sequence[int],
+          candidates: int,
+          blacklist: Set[int],
+          activity: Optional[Mapping[int, float]] = None,
+          needed: int = 0) -> Tally:
+    """Counts a vote.
+
+    Args:
+        voters: Voter of each vote.
+        choices: Candidate of each vote.
+        candidates: Number of candidates on the ballot.
+        blacklist: Users whose votes never count.
+        activity: Messages each user sent in the window before the vote.
+            Without it, only the blacklist is applied.
+        needed: Messages a voter needs for their votes to count.
+    """
+    levels = max(1, needed)
+    everyone = set(voters)
+    reasons: Dict[int, str] = dict.fromkeys(everyone & blacklist, BLACKLISTED)
+    low: Dict[int, int] = {}
+    if activity is not None:
+        eligible = everyone - blacklist
+        reasons.update(dict.fromkeys(eligible - activity.keys(), INACTIVE))
+        low = {voter: int(activity[voter]) for voter in eligible & activity.keys() if activity[voter] < needed}
+        reasons.update(dict.fromkeys(low, LOW_ACTIVITY))
+
+    counted = collections.Counter(choice for voter, choice in zip(voters, choices) if voter not in reasons)
+    levels_hit = collections.Counter(
+        (choice, min(low[voter], levels - 1)) for voter, choice in zip(voters, choices) if voter in low)
+    histogram = [[0] * levels for _ in range(candidates)]
+    for (choice, level), hits in levels_hit.items():
+        histogram[choice][level] = hits
+
+    disregarded = {voter: reasons[voter] for voter in dict.fromkeys(voters) if voter in reasons}
+    return Tally(
+        votes=[counted[candidate] for candidate in range(candidates)],
+        disregarded=disregarded,
+        disregarded_votes=len(voters) - sum(counted.values()),
+        histogram=histogram,
+    )
+
+
+def resolve(tally: Tally, cascade: bool = True, rng: Optional[random.Random] = None) -> Resolution:
+    """Picks the winner of a counted vote.
+
+    Candidates tied on votes are narrowed down by their disregarded votes,
+    from the most active disregarded voters down, and whoever is left after
+    that is picked at random.
+
+    Args:
+        tally: The counted vote.
+        cascade: Narrow ties down by disregarded votes before picking at random.
+        rng: Source of the random pick, the ``random`` module by default.
+    """
+    top = max(tally.votes, default=0)
+    tied = [candidate for candidate, votes in enumerate(tally.votes) if votes == top]
+    if len(tied) == 1:
+        return Resolution(tied[0], NO_TIE, tied)
+
+    steps: List[Tuple[int, List[int]]] = []
+    if cascade:
+        for level in range(len(tally.histogram[0]) - 1, -1, -1):
+            best = max(tally.histogram[candidate][level] for candidate in tied)
+            tied = [candidate for candidate in tied if tally.histogram[candidate][level] == best]
+            steps.append((level, tied))
+            if len(tied) == 1:
+                return Resolution(tied[0], RULE_DISREGARDED, tied, steps)
+    return Resolution((rng or random).choice(tied), RULE_RANDOM, tied, steps)
+
+
+def read_fixture(path: str) -> Tuple[dict, array.array, array.array, Dict[int, float]]:
+    """Reads the votes and activity of a fixture, see ``kumo_bot.utils.fixtures``.
+
+    Returns:
+        The fixture's header, the vote arrays and the messages per user,
+        with the democracy users given unlimited activity.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    voters = array.array("q")
+    choices = array.array("B")
+    activity: Dict[int, float] = collections.Counter()
+    with opener(path, "rt", encoding="utf-8") as fixture:
+        header = json.loads(fixture.readline())
+        for line in fixture:
+            entry = json.loads(line)
+            if entry[0] == "m":
+                activity[entry[2]] += 1
+            elif entry[0] == "r":
+                voters.append(entry[2])
+                choices.append(entry[1])
+    activity = dict(activity)
+    for user in header.get("democracy", []):
+        activity[user] = float("inf")
+    return header, voters, choices, activity
+
+
+def describe(tally: Tally, resolution: Resolution, needed: int) -> Iterable[str]:
+    """Lines describing a counted and resolved vote."""
+    yield f"Threshold: {needed} messages"
+    for candidate, votes in enumerate(tally.votes):
+        yield f"  {candidate}: {votes} counted"
+    reasons = collections.Counter(tally.disregarded.values())
+    yield f"Disregarded: {len(tally.disregarded)} voters, {tally.disregarded_votes} votes"
+    for reason, voters in sorted(reasons.items()):
+        yield f"  {reason}: {voters}"
+    for level, left in resolution.cascade:
+        yield f"  level {level}: {_joined(left)} left"
+    yield f"Winner: {resolution.winner} (rule {resolution.rule}, tied {_joined(resolution.tied)})"
+
+
+def _joined(items: Iterable[int]) -> str:
+    """Joins numbers into a comma separated list."""
+    return ", ".join(map(str, items))
+
+
+def main() -> None:
+    """Counts a recorded vote from the command line."""
+    parser = argparse.ArgumentParser(prog="python -m kumo_bot.tally", description="Counts a recorded vote.")
+    parser.add_argument("fixture", help="Fixture written by /override record.")
+    parser.add_argument("--modes", type=int, nargs="+", choices=range(4), default=[0, 3], help="Vote count modes.")
+    parser.add_argument("--threshold", type=int, help="Messages needed for votes to count, instead of the mode's.")
+    parser.add_argument("--seed", type=int, help="Seed of random picks and thresholds.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    header, voters, choices, activity = read_fixture(args.fixture)
+    blacklist = set(header.get("blacklist", []))
+    for mode in args.modes:
+        needed = args.threshold if args.threshold is not None else threshold(mode, rng)
+        counted = count(voters, choices, len(header["candidates"]), blacklist, activity if mode != 3 else None, needed)
+        print(f"Mode {mode}")
+        for line in describe(counted, resolve(counted, cascade=mode != 3, rng=rng), needed):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Local index of per-user message activity.
+
+Closing a vote needs the number of messages every voter sent in a time window.
+Walking the channel history over REST for that takes minutes on busy channels,
+so the Tracking cog feeds every message into a SQLite database instead and the
+index answers those questions locally.
+
+Message ids are snowflakes, so the primary key doubles as the time bucket:
+a time range is a range of ids and is served by the covering index below.
+"""
+import datetime
+import logging
+import pathlib
+import sqlite3
+from typing import Dict, Iterable, List, Tuple, Union
+
+import discord
+
+from kumo_bot.utils.scanning import HistoryScanner
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_channel ON messages (channel_id, message_id, author_id);
+"""
+
+Channel = Union[discord.TextChannel, discord.Thread]
+
+
+def _lower_id(after: datetime.datetime) -> int:
+    """Largest id that is still not after the given time."""
+    return discord.utils.time_snowflake(after, high=True)
+
+
+def _upper_id(before: datetime.datetime) -> int:
+    """Smallest id that is no longer before the given time."""
+    return discord.utils.time_snowflake(before, high=False)
+
+
+class ActivityIndex:
+    """SQLite backed index of messages per channel and author.
+
+    Which part of a channel's history is indexed is tracked by a
+    ``HistoryScanner`` checkpoint, so syncing only fetches missing messages.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]) -> None:
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self.scanner = HistoryScanner(self._db, "activity")
+
+    def close(self) -> None:
+        """Closes the underlying database."""
+        self._db.close()
+
+    def tracks(self, channel_id: int) -> bool:
+        """Whether messages in the channel are being indexed."""
+        return self.scanner.checkpoint(channel_id) is not None
+
+    # LIVE FEED
+
+    def record(self, message: discord.Message) -> None:
+        """Indexes a freshly received message of a tracked channel."""
+        if not self.tracks(message.channel.id):
+            return
+        self._db.execute("INSERT OR IGNORE INTO messages (message_id, channel_id, author_id) VALUES (?, ?, ?)",
+                         (message.id, message.channel.id, message.author.id))
+        self.scanner.advance(message)
+
+    def forget(self, message_ids: Iterable[int]) -> None:
+        """Removes deleted messages from the index."""
+        self._db.executemany("DELETE FROM messages WHERE message_id = ?", ((mid,) for mid in message_ids))
+        self._db.commit()
+
+    def suspend(self) -> None:
+        """Marks all channels as possibly missing messages."""
+        self.scanner.suspend()
+
+    # SCANNING
+
+    def _consume(self, batch: List[discord.Message]) -> None:
+        self._db.executemany("INSERT OR IGNORE INTO messages (message_id, channel_id, author_id) VALUES (?, ?, ?)",
+                             ((message.id, message.channel.id, message.author.id) for message in batch))
+
+    async def sync(self, channel: Channel, after: datetime.datetime) -> None:
+        """Makes sure the index covers the channel from ``after`` up to now.
+
+        The first call for a channel backfills the requested range, later
+        calls only fetch messages older than the covered range or newer than
+        the last known message.
+        """
+        await self.scanner.scan(channel, after, self._consume)
+
+    def prune(self, channel_id: int, before: datetime.datetime) -> None:
+        """Drops indexed messages older than ``before``."""
+        cov = self.scanner.checkpoint(channel_id)
+        cutoff = _lower_id(before)
+        if cov is None or cutoff <= cov[0]:
+            return
+        self._db.execute("DELETE FROM messages WHERE channel_id = ? AND message_id <= ?", (channel_id, cutoff))
+        self.scanner.restrict(channel_id, cutoff)
+
+    # QUERIES
+
+    def counts(self, channel_id: int, after: datetime.datetime, before: datetime.datetime) -> Dict[int, int]:
+        """Message counts per author id for messages strictly between two times."""
+        rows = self._db.execute(
+            "SELECT author_id, COUNT(*) FROM messages WHERE channel_id = ? AND message_id > ? AND message_id < ? "
+            "GROUP BY author_id", (channel_id, _lower_id(after), _upper_id(before)))
+        return dict(rows.fetchall())
+
+    def count(self, channel_id: int, author_id: int, after: datetime.datetime, before: datetime.datetime) -> int:
+        """Message count of a single author between two times."""
+        row = self._db.execute(
+            "SELECT COUNT(*) FROM messages WHERE channel_id = ? AND message_id > ? AND message_id < ? "
+            "AND author_id = ?", (channel_id, _lower_id(after), _upper_id(before), author_id)).fetchone()
+        return row[0]
+
+    async def verify(self,
+                     channel: Channel,
+                     after: datetime.datetime,
+                     before: datetime.datetime,
+                     repair: bool = False) -> Dict[int, Tuple[int, int]]:
+        """Compares the index against a live history scan.
+
+        Args:
+            channel: The channel to check.
+            after: Start of the checked range.
+            before: End of the checked range.
+            repair: Replace the indexed range with the scanned messages.
+
+        Returns:
+            Author ids mapped to (indexed, scanned) counts wherever they differ.
+        """
+        indexed = self.counts(channel.id, after, before)
+        scanned: Dict[int, int] = {}
+        rows: List[Tuple[int, int, int]] = []
+        async for message in channel.history(after=after, before=before, oldest_first=True, limit=None):
+            scanned[message.author.id] = scanned.get(message.author.id, 0) + 1
+            rows.append((message.id, channel.id, message.author.id))
+        mismatches = {
+            author: (indexed.get(author, 0), scanned.get(author, 0))
+            for author in indexed.keys() | scanned.keys()
+            if indexed.get(author, 0) != scanned.get(author, 0)
+        }
+        if mismatches and repair:
+            self._db.execute("DELETE FROM messages WHERE channel_id = ? AND message_id > ? AND message_id < ?",
+                             (channel.id, _lower_id(after), _upper_id(before)))
+            self._db.executemany("INSERT OR IGNORE INTO messages (message_id, channel_id, author_id) VALUES (?, ?, ?)",
+                                 rows)
+            self._db.commit()
+            logging.info("Repaired activity index for %s.", channel)
+        return mismatches
@@ -0,0 +1,86 @@
+"""Authorization behind the check decorators.
+
+Owners come from the bot's application and are kept as a set, rebuilt
+whenever the application is fetched. Whether a member is an admin or an
+operator is worked out once per guild and user, and reused until a member
+or role update drops it or it expires.
+"""
+import time
+from typing import Dict, FrozenSet, Optional, Tuple, Union
+
+import discord
+
+# Authorization levels, each one allowed everything the lower ones are
+NOBODY = 0
+OPERATOR = 1
+ADMIN = 2
+OWNER = 3
+
+# Seconds a decision is reused for. Member updates only arrive with the
+# members intent, so decisions have to expire on their own as well.
+DECISION_TTL = 60
+
+
+class Authorizer:
+    """The owners of the bot and the cached decisions for guild members.
+
+    Attributes:
+        owners: Ids of the application's owner, or of its team members.
+        hits: Decisions served from the cache.
+        misses: Decisions worked out anew.
+    """
+
+    def __init__(self) -> None:
+        self.owners: FrozenSet[int] = frozenset()
+        self.hits = 0
+        self.misses = 0
+        self._decisions: Dict[Tuple[int, int], Tuple[float, int]] = {}
+
+    def refresh(self, application: discord.AppInfo) -> None:
+        """Takes the owners of a freshly fetched application."""
+        if application.team:
+            self.owners = frozenset(member.id for member in application.team.members)
+        else:
+            self.owners = frozenset((application.owner.id,))
+
+    def level(self, user: Union[discord.User, discord.Member], operator_role: Optional[int] = None) -> int:
+        """The authorization level of a user.
+
+        Args:
+            user: The user, as a member when inside a guild.
+            operator_role: Id of the configured operator role, if any.
+        """
+        if user.id in self.owners:
+            return OWNER
+        if not isinstance(user, discord.Member):
+            return NOBODY
+        key = (user.guild.id, user.id)
+        now = time.monotonic()
+        cached = self._decisions.get(key)
+        if cached is not None and now - cached[0] < DECISION_TTL:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        if user.guild_permissions.administrator:
+            level = ADMIN
+        elif operator_role is not None and user.get_role(operator_role) is not None:
+            level = OPERATOR
+        else:
+            level = NOBODY
+        self._decisions[key] = (now, level)
+        return level
+
+    def invalidate_member(self, guild_id: int, user_id: int) -> None:
+        """Drops the decision for a member that changed or left."""
+        self._decisions.pop((guild_id, user_id), None)
+
+    def invalidate_guild(self, guild_id: int) -> None:
+        """Drops the decisions for a guild whose roles or owner changed."""
+        self._decisions = {key: decision for key, decision in self._decisions.items() if key[0] != guild_id}
+
+    def clear(self) -> None:
+        """Drops all decisions, for instance after the operator role changed."""
+        self._decisions = {}
+
+    def __len__(self) -> int:
+        return len(self._decisions)
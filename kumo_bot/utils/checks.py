@@ -1,32 +1,50 @@
 """Custom checks for Discord commands."""
+from typing import Optional
+
 import discord
 from discord import app_commands
 
+from kumo_bot.utils import auth
+
+
+def command_vote(interaction: discord.Interaction, channel: Optional[discord.abc.Snowflake] = None):
+    """The running vote a command refers to.
+
+    That is the vote in the given channel, or else the vote in the channel the
+    command was used in, or the only vote running in the guild.
+    """
+    votes = interaction.client.config.votes
+    if channel is not None:
+        return votes.resolve(channel.id)
+    return votes.resolve(interaction.channel_id, interaction.guild_id)
+
 
 def vote_running():
     """Returns whether a vote is running."""
 
     async def predicate(interaction: discord.Interaction):
         """The predicate for the check."""
-        config = interaction.client.config
-        if not config.vote_running or interaction.user == interaction.client.user:
+        vote = command_vote(interaction, getattr(interaction.namespace, "channel", None))
+        if vote is None or interaction.user == interaction.client.user:
             raise app_commands.CheckFailure("No vote is currently running.")
         return True
 
     return app_commands.check(predicate)
 
 
+def level(interaction: discord.Interaction) -> int:
+    """The authorization level of the user of an interaction, see ``auth``."""
+    client = interaction.client
+    try:
+        operator_role = client.config.role_id
+    except (KeyError, ValueError):
+        operator_role = None
+    return client.auth.level(interaction.user, operator_role)
+
+
 async def predicate_isowner(interaction: discord.Interaction):
     """The predicate for the is_owner check."""
-    app_info = interaction.client.application
-    if app_info.team:
-        # Bot is owned by a team
-        is_team_owner = interaction.user.id in [member.id for member in app_info.team.members]
-    else:
-        # Bot is owned by a single user
-        is_team_owner = interaction.user.id == app_info.owner.id
-
-    if not is_team_owner:
+    if interaction.user.id not in interaction.client.auth.owners:
         raise app_commands.CheckFailure("You are not the owner of this bot.")
     return True
 
@@ -38,16 +56,9 @@ def is_owner():
 
 async def predicate_isadmin(interaction: discord.Interaction):
     """The predicate for the is_admin check."""
-    try:
-        bypass = await predicate_isowner(interaction)
-    except app_commands.CheckFailure:
-        pass
-    else:
-        return bypass
-    # Check if user has Administrator permission
-    if isinstance(interaction.user, discord.Member) and interaction.user.guild_permissions.administrator:
-        return True
-    raise app_commands.CheckFailure("You don't have permission to use this command.")
+    if level(interaction) < auth.ADMIN:
+        raise app_commands.CheckFailure("You don't have permission to use this command.")
+    return True
 
 
 def is_admin():
@@ -59,17 +70,8 @@ def is_operator():
     """Check if user has Operator role, is admin or owner."""
 
     async def predicate(interaction: discord.Interaction):
-        # Check if user has the configured admin role
-        try:
-            bypass = await predicate_isadmin(interaction)
-        except app_commands.CheckFailure:
-            pass
-        else:
-            return bypass
-        config = interaction.client.config
-        if hasattr(config, "role_id") and config.role_id:
-            if isinstance(interaction.user, discord.Member) and interaction.user.get_role(config.role_id):
-                return True
-        raise app_commands.CheckFailure("You don't have permission to use this command.")
+        if level(interaction) < auth.OPERATOR:
+            raise app_commands.CheckFailure("You don't have permission to use this command.")
+        return True
 
     return app_commands.check(predicate)
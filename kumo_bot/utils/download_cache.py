@@ -0,0 +1,196 @@
+"""On-disk cache of downloaded stories.
+
+Entries are addressed by the canonical story url together with the site's
+last-updated metadata, so an updated story never hits a stale file. The cache
+is bounded by total size and evicts the least recently used files first.
+The index and the file moves are written off the event loop.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import pathlib
+import shutil
+import threading
+import time
+from typing import Dict, Optional, Union
+
+from kumo_bot.config.settings import WRITE_DELAY, write_json
+
+
+def cache_key(url: str, updated: str) -> str:
+    """The content address of a story version."""
+    return hashlib.sha256(f"{url}\n{updated}".encode("utf-8")).hexdigest()
+
+
+class DownloadCache:
+    """Size-bounded LRU cache of story files.
+
+    Args:
+        directory: Where cached files and the index live.
+        max_bytes: Total size of cached files to stay under.
+        probe_ttl: Seconds a cached story is served without checking the
+            site for updates again.
+    """
+
+    def __init__(self, directory: Union[str, pathlib.Path], max_bytes: int, probe_ttl: float) -> None:
+        self._dir = pathlib.Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._index_file = self._dir / "index.json"
+        self.max_bytes = max_bytes
+        self.probe_ttl = probe_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, dict] = {}
+        self._pending: Optional[asyncio.TimerHandle] = None
+        self._write_lock = threading.Lock()
+        self._version = 0
+        self._written = 0
+        try:
+            with open(self._index_file, encoding="utf-8") as index_f:
+                self._entries = json.load(index_f)
+        except FileNotFoundError:
+            pass
+        except json.decoder.JSONDecodeError:
+            logging.warning("Download cache index could not be read, starting empty.")
+        # Drop entries whose files went missing.
+        self._entries = {key: entry for key, entry in self._entries.items() if (self._dir / entry["file"]).exists()}
+
+    def _save(self) -> None:
+        """Schedules the index to be written, batching changes made within WRITE_DELAY.
+
+        Without a running loop the index is written at once.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._version += 1
+        if self._pending is None:
+            self._pending = loop.call_later(WRITE_DELAY, self._write_behind, loop)
+
+    def _write_behind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._pending = None
+        future = loop.run_in_executor(None, self._write, copy.deepcopy(self._entries), self._version)
+        future.add_done_callback(self._written_behind)
+
+    @staticmethod
+    def _written_behind(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logging.error("Could not write the download cache index.", exc_info=future.exception())
+
+    def _write(self, entries: Dict[str, dict], version: int) -> None:
+        with self._write_lock:
+            if version < self._written:
+                return
+            write_json(str(self._index_file), entries)
+            self._written = version
+
+    def flush(self) -> None:
+        """Writes pending index changes right away."""
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        self._version += 1
+        self._write(copy.deepcopy(self._entries), self._version)
+
+    @property
+    def size(self) -> int:
+        """Total size of the cached files in bytes."""
+        return sum(entry["size"] for entry in self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _use(self, key: str) -> pathlib.Path:
+        entry = self._entries[key]
+        entry["used"] = time.time()
+        self.hits += 1
+        self._save()
+        return self._dir / entry["file"]
+
+    def recent(self, url: str) -> Optional[pathlib.Path]:
+        """A cached file of the story that was checked for updates recently."""
+        now = time.time()
+        for key, entry in self._entries.items():
+            if entry["url"] == url and now - entry["checked"] < self.probe_ttl:
+                return self._use(key)
+        return None
+
+    def has(self, url: str) -> bool:
+        """Whether any version of a story is cached."""
+        return any(entry["url"] == url for entry in self._entries.values())
+
+    def get(self, key: str) -> Optional[pathlib.Path]:
+        """The cached file of a story version, if present."""
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        self._entries[key]["checked"] = time.time()
+        return self._use(key)
+
+    def name(self, path: pathlib.Path) -> str:
+        """The original file name of a cached file."""
+        for entry in self._entries.values():
+            if entry["file"] == path.name:
+                return entry["name"]
+        return path.name
+
+    async def put(self, key: str, url: str, source: Union[str, pathlib.Path]) -> pathlib.Path:
+        """Moves a freshly downloaded file into the cache, off the event loop.
+
+        Args:
+            key: The story version's content address.
+            url: The canonical story url.
+            source: The downloaded file, which is moved.
+        """
+        source = pathlib.Path(source)
+        target = self._dir / f"{key}{source.suffix}"
+        size = await asyncio.to_thread(self._move, source, target)
+        now = time.time()
+        # Older versions of the same story are never served again.
+        for old in [k for k, entry in self._entries.items() if entry["url"] == url and k != key]:
+            self._remove(old)
+        self._entries[key] = {
+            "file": target.name,
+            "name": source.name,
+            "url": url,
+            "size": size,
+            "used": now,
+            "checked": now,
+        }
+        self._evict()
+        self._save()
+        return target
+
+    @staticmethod
+    def _move(source: pathlib.Path, target: pathlib.Path) -> int:
+        shutil.move(source, target)
+        return target.stat().st_size
+
+    def discard(self, url: str, unused_since: Optional[float] = None) -> None:
+        """Removes the cached versions of a story.
+
+        Args:
+            url: The canonical story url.
+            unused_since: Only versions not served since this time are removed.
+        """
+        for key in [k for k, entry in self._entries.items() if entry["url"] == url]:
+            if unused_since is None or self._entries[key]["used"] <= unused_since:
+                self._remove(key)
+        self._save()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        (self._dir / entry["file"]).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        total = self.size
+        for key in sorted(self._entries, key=lambda k: self._entries[k]["used"]):
+            if total <= self.max_bytes or len(self._entries) <= 1:
+                break
+            total -= self._entries[key]["size"]
+            logging.info("Evicting %s from the download cache.", self._entries[key]["url"])
+            self._remove(key)
@@ -0,0 +1,203 @@
+"""Queue in front of the story downloader.
+
+Every download goes through one queue: concurrent requests for the same story
+share a single job, a fixed number of jobs run at once, and each user can only
+have a few downloads pending.
+"""
+import asyncio
+import collections
+import dataclasses
+import heapq
+import itertools
+import logging
+import pathlib
+import time
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from kumo_bot.utils import downloaders
+
+# Job priorities, lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 10
+
+
+class DownloadQueueFull(Exception):
+    """Raised when a user already has too many downloads pending."""
+
+
+@dataclasses.dataclass(eq=False)
+class DownloadJob:
+    """A queued or running download, shared by everyone waiting for the story."""
+    url: str
+    priority: int
+    seq: int
+    future: asyncio.Future
+    requesters: Set[int] = dataclasses.field(default_factory=set)
+    interest: int = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    discard: bool = False
+
+    @property
+    def order(self) -> Tuple[int, int]:
+        """Sort key of the job in the queue."""
+        return self.priority, self.seq
+
+
+class DownloadQueue:
+    """Single-flight download queue with a global concurrency cap.
+
+    Args:
+        workers: Number of downloads running at once.
+        per_user: Pending downloads allowed per requesting user.
+    """
+
+    def __init__(self, workers: int, per_user: int) -> None:
+        self.workers = workers
+        self.per_user = per_user
+        self._heap: List[Tuple[int, int, DownloadJob]] = []
+        self._jobs: Dict[str, DownloadJob] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._durations: Deque[float] = collections.deque(maxlen=20)
+
+    def start(self) -> None:
+        """Starts the queue's workers."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work(), name=f"download worker {i}") for i in range(self.workers)]
+
+    def stop(self) -> None:
+        """Stops the workers and fails everything still queued."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        for job in self._jobs.values():
+            if not job.future.done():
+                job.future.cancel()
+        self._jobs = {}
+        self._heap = []
+
+    async def load(self) -> None:
+        """Loads the downloader off the event loop, await it before the first ``submit``."""
+        await downloaders.load()
+
+    def cached(self, url: str) -> bool:
+        """Whether any version of a story is in the download cache."""
+        return downloaders.cache.has(downloaders.canonical_url(url))
+
+    def discard(self, job: DownloadJob) -> None:
+        """Drops the story a job downloaded from the download cache, unless someone else wants it.
+
+        The story stays if a user joined the job or was served it from the
+        cache after it finished. A job still running is dropped once done.
+        """
+        if job.requesters:
+            return
+        if not job.future.done():
+            job.discard = True
+        elif not job.future.cancelled() and job.future.exception() is None:
+            downloaders.cache.discard(job.url, unused_since=job.finished)
+
+    def submit(self, url: str, requester: Optional[int] = None, priority: int = PRIORITY_INTERACTIVE) -> DownloadJob:
+        """Queues a download, joining the job already in flight for the same story.
+
+        Args:
+            url: The story url.
+            requester: Id of the requesting user, counted against their limit.
+            priority: Job priority, lower runs first.
+
+        Raises:
+            DownloadQueueFull: The requester has too many downloads pending.
+        """
+        canonical = downloaders.canonical_url(url)
+        job = self._jobs.get(canonical)
+        if requester is not None and (job is None or requester not in job.requesters):
+            if self.pending(requester) >= self.per_user:
+                raise DownloadQueueFull(f"You already have {self.per_user} downloads pending.")
+        if job is None:
+            job = DownloadJob(canonical, priority, next(self._seq), asyncio.get_running_loop().create_future())
+            self._jobs[canonical] = job
+            heapq.heappush(self._heap, (priority, job.seq, job))
+            self._wakeup.set()
+        elif priority < job.priority and job.started is None:
+            # Someone more urgent joined, the stale heap entry is skipped when popped.
+            job.priority = priority
+            heapq.heappush(self._heap, (priority, job.seq, job))
+        if requester is not None:
+            job.requesters.add(requester)
+        job.interest += 1
+        return job
+
+    def release(self, job: DownloadJob) -> None:
+        """Signals one waiter lost interest; unstarted jobs nobody wants are dropped."""
+        job.interest -= 1
+        if job.interest <= 0 and job.started is None and not job.future.done():
+            job.future.cancel()
+            if self._jobs.get(job.url) is job:
+                del self._jobs[job.url]
+
+    async def wait(self, job: DownloadJob) -> Tuple[pathlib.Path, str]:
+        """Waits for a job without cancelling it for the other waiters."""
+        return await asyncio.shield(job.future)
+
+    def pending(self, requester: int) -> int:
+        """Number of unfinished downloads requested by a user."""
+        return sum(1 for job in self._jobs.values() if requester in job.requesters)
+
+    def position(self, job: DownloadJob) -> int:
+        """Number of queued jobs ahead of a job, 0 once it runs."""
+        if job.started is not None:
+            return 0
+        return sum(1 for other in self._jobs.values() if other.started is None and other.order < job.order)
+
+    @property
+    def average_duration(self) -> float:
+        """Average duration of recent downloads in seconds."""
+        if not self._durations:
+            return 60.0
+        return sum(self._durations) / len(self._durations)
+
+    def eta(self, job: DownloadJob) -> float:
+        """Estimated seconds until a job is done."""
+        avg = self.average_duration
+        if job.started is not None:
+            return max(0.0, avg - (time.monotonic() - job.started))
+        return (self.position(job) // self.workers + 1) * avg
+
+    def _pop(self) -> Optional[DownloadJob]:
+        while self._heap:
+            priority, _, job = heapq.heappop(self._heap)
+            if job.future.done() or job.started is not None or priority != job.priority:
+                continue
+            return job
+        return None
+
+    async def _work(self) -> None:
+        while True:
+            job = self._pop()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            job.started = time.monotonic()
+            try:
+                # Fetches are bounded by the host timeout, so a hung site fails the job instead of keeping it.
+                result = await downloaders.fetch_story(job.url)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                job.future.set_exception(e)
+                # Mark it retrieved, waiters get it through wait().
+                job.future.exception()
+            else:
+                job.finished = time.time()
+                job.future.set_result(result)
+                self._durations.append(time.monotonic() - job.started)
+                if job.discard and not job.requesters:
+                    downloaders.cache.discard(job.url, unused_since=job.finished)
+            finally:
+                if self._jobs.get(job.url) is job:
+                    del self._jobs[job.url]
+            logging.info("Download of %s finished in %.1fs.", job.url, time.monotonic() - job.started)
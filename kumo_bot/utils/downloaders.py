@@ -1,52 +1,239 @@
 """Download utilities for fanfiction and novels."""
 import asyncio
-import functools
-import io
+import concurrent.futures
+import dataclasses
 import logging
-import re
+import pathlib
+import threading
+import time
+import types
+from typing import Any, Callable, Optional, Tuple
+from urllib.parse import urlparse
 
-import discord
-from fanficfare import cli, exceptions
+from kumo_bot.config import constants
+from kumo_bot.utils.download_cache import DownloadCache, cache_key
+from kumo_bot.utils.metrics import metrics
+from kumo_bot.utils.throttle import HostScheduler
 
+cache = DownloadCache(constants.ddir / "epubs", constants.DOWNLOAD_CACHE_BYTES, constants.DOWNLOAD_PROBE_TTL)
+hosts = HostScheduler(constants.HOST_CONCURRENCY, cooldown=constants.HOST_COOLDOWN, timeout=constants.HOST_TIMEOUT)
 
-async def fetch_download(url: str) -> discord.File:
-    """Fetches a file from an url.
+_worker = threading.local()
+_fanficfare: Optional[types.SimpleNamespace] = None
+_fanficfare_lock = threading.Lock()
 
-    Args:
-        url: The url to fetch the file from.
+
+def fanficfare() -> types.SimpleNamespace:
+    """FanFicFare's modules, imported on first use.
+
+    FanFicFare takes longer to import than the rest of the bot, so boots that
+    never download skip it. Its loggers are quieted as part of the import.
+
+    Returns:
+        A namespace of the ``adapters``, ``cli`` and ``exceptions`` modules,
+        and ``story_errors``: failures caused by the story or url rather than
+        the site, which don't count against a host.
     """
-    loop = asyncio.get_event_loop()
-    string_io = io.StringIO()
-    log_handler = logging.StreamHandler(string_io)
-    cli.logger.addHandler(log_handler)
+    global _fanficfare  # pylint: disable=global-statement
+    with _fanficfare_lock:
+        if _fanficfare is None:
+            started = time.perf_counter()
+            # pylint: disable-next=import-outside-toplevel
+            from fanficfare import adapters, cli, exceptions, loghandler
+            # FanFicFare's records reach the log file through the root logger, only its warnings are kept.
+            loghandler.setLevel(logging.CRITICAL)
+            cli.logger.setLevel(logging.WARNING)
+            story_errors = (exceptions.InvalidStoryURL, exceptions.StoryDoesNotExist, exceptions.UnknownSite,
+                            exceptions.AccessDenied, exceptions.FailedToLogin, exceptions.AdultCheckRequired)
+            _fanficfare = types.SimpleNamespace(adapters=adapters,
+                                                cli=cli,
+                                                exceptions=exceptions,
+                                                story_errors=story_errors)
+            seconds = time.perf_counter() - started
+            metrics.observe("fanficfare", "import", seconds)
+            logging.info("Imported FanFicFare in %.2fs.", seconds)
+    return _fanficfare
+
+
+async def load() -> None:
+    """Imports FanFicFare on a thread if it isn't yet, keeping the event loop free.
+
+    Await this before the first ``canonical_url`` call of a download, for
+    instance through ``DownloadQueue.load``.
+    """
+    if _fanficfare is None:
+        await asyncio.to_thread(fanficfare)
+
+
+@dataclasses.dataclass
+class DownloadResult:
+    """Outcome of a download job.
+
+    Attributes:
+        url: The canonical story url.
+        path: The written file, if the download succeeded.
+        title: The story title, if the metadata could be read.
+        updated: The site's last-updated metadata of the story.
+        error: What went wrong, if anything.
+        host_error: Whether the error points at the site rather than the story.
+        adapter: The FanFicFare adapter holding the fetched metadata, handed
+            to ``_download_job`` so it isn't fetched twice.
+    """
+    url: str
+    path: Optional[str] = None
+    title: Optional[str] = None
+    updated: Optional[str] = None
+    error: Optional[str] = None
+    host_error: bool = False
+    adapter: Any = dataclasses.field(default=None, repr=False)
+
+
+def _failure(url: str, e: Exception) -> DownloadResult:
+    """A failed result for an exception raised by FanFicFare."""
+    story_errors = fanficfare().story_errors
+    return DownloadResult(url, error=f"{type(e).__name__}: {e}", host_error=not isinstance(e, story_errors))
+
+
+def _init_worker() -> None:
+    """Prepares a worker thread: FanFicFare options are parsed once per worker."""
+    cli = fanficfare().cli
     options, _ = cli.mkParser(calibre=False).parse_args(["--non-interactive", "--force", "-o is_adult=true"])
     cli.expandOptions(options)
+    _worker.options = options
+    _worker.configurations = {}
+
+
+def _configuration(url: str):
+    """The worker's configuration for a site.
+
+    Configurations are kept per site, which keeps their HTTP sessions and
+    cookies alive between jobs of the same worker.
+    """
+    site = urlparse(url).netloc
+    configuration = _worker.configurations.get(site)
+    if configuration is None:
+        configuration = fanficfare().cli.get_configuration(url, None, None, _worker.options)
+        _worker.configurations[site] = configuration
+    return configuration
+
+
+def _metadata_job(url: str) -> DownloadResult:
+    """Fetches only the metadata of a story."""
     try:
-        await loop.run_in_executor(
-            None,
-            functools.partial(
-                cli.dispatch,
-                options,
-                [url],
-                warn=cli.logger.warn,
-                fail=cli.logger.critical,
-            ),
-        )
-    except exceptions.UnknownSite:
-        filename = None
-    else:
-        logread = string_io.getvalue()
-        string_io.close()
-        cli.logger.removeHandler(log_handler)
-        log_handler.close()
-        regexed = re.search(r"Successfully wrote '(.*)'", logread)
-        if regexed:
-            filename = regexed.group(1)
+        adapter = fanficfare().adapters.getAdapter(_configuration(url), url)
+        story = adapter.getStoryMetadataOnly()
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        return _failure(url, e)
+    return DownloadResult(url,
+                          title=story.getMetadata("title"),
+                          updated=str(story.getMetadata("dateUpdated")),
+                          adapter=adapter)
+
+
+def _download_job(url: str, adapter: Any = None) -> DownloadResult:
+    """Downloads a story as an epub.
+
+    Args:
+        url: The canonical story url.
+        adapter: The adapter of an earlier ``_metadata_job``, if it succeeded.
+    """
+    try:
+        modules = fanficfare()
+        configuration = _configuration(url)
+        if adapter is None:
+            adapter = modules.adapters.getAdapter(configuration, url)
+        story = adapter.getStoryMetadataOnly()
+        path = modules.cli.write_story(configuration, adapter, "epub")
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        return _failure(url, e)
+    return DownloadResult(url,
+                          path=path,
+                          title=story.getMetadata("title"),
+                          updated=str(story.getMetadata("dateUpdated")))
+
+
+class DownloadPool:
+    """Bounded pool of FanFicFare worker threads.
+
+    Workers start with the first job. Each parses its options once and keeps
+    per-site configurations, so jobs skip the setup FanFicFare's CLI repeats
+    on every call. Jobs return a ``DownloadResult`` instead of reporting
+    through FanFicFare's logger.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                               thread_name_prefix="fanficfare",
+                                                               initializer=_init_worker)
+
+    async def run(self, job: Callable[..., Any], *args) -> Any:
+        """Runs a job on a worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, job, *args)
+
+    def shutdown(self) -> None:
+        """Stops the workers, dropping queued jobs."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+pool = DownloadPool(constants.DOWNLOAD_WORKERS)
+
+
+def canonical_url(url: str) -> str:
+    """The url a story is cached under."""
+    return fanficfare().adapters.getNormalStoryURL(url) or url
+
+
+async def fetch_story(url: str) -> Tuple[pathlib.Path, str]:
+    """Fetches a story into the download cache.
+
+    Unchanged stories are served from the download cache. A story checked
+    for updates within the probe TTL is served without contacting the site.
+    Everything else goes through the host's slot in ``hosts``.
+
+    Args:
+        url: The url to fetch the story from.
+
+    Returns:
+        The cached file and the name it should be sent as.
+
+    Raises:
+        CircuitOpen: The story's site is considered down.
+        ConnectionError: The site failed to serve the story.
+        TimeoutError: The site took longer than ``HOST_TIMEOUT``. The worker
+            thread is left to finish on its own, but the host's slot and the
+            queued job are freed.
+        ValueError: The story could not be downloaded.
+    """
+    await load()
+    canonical = canonical_url(url)
+    cached = cache.recent(canonical)
+    if cached is not None:
+        logging.info("Serving %s from the download cache.", canonical)
+        metrics.count("downloads", outcome="cached")
+        return cached, cache.name(cached)
+
+    host = urlparse(canonical).netloc
+    async with hosts.slot(host):
+        meta: DownloadResult = await pool.run(_metadata_job, canonical)
+        if meta.error is None:
+            cached = cache.get(cache_key(canonical, meta.updated))
+            if cached is not None:
+                logging.info("Serving unchanged %s from the download cache.", canonical)
+                metrics.count("downloads", outcome="unchanged")
+                return cached, cache.name(cached)
         else:
-            filename = None
-            logging.info("Failed to download. IO:\n %s", logread)
-    if isinstance(filename, str):
-        logging.info("Successfully downloaded %s", filename)
-        return discord.File(fp=filename)
-    raise NotImplementedError(
-        "FanFicFare failed to download. Due to security issues lightnovel-crawler is currently unsupported.")
+            cache.misses += 1
+            logging.info("Could not fetch story metadata for %s, skipping cache. %s", canonical, meta.error)
+
+        result: DownloadResult = await pool.run(_download_job, canonical, meta.adapter)
+        if result.error is not None and result.host_error:
+            metrics.count("downloads", outcome="host_error")
+            raise ConnectionError(f"{host} failed to serve {canonical}: {result.error}")
+    if result.error is not None or result.path is None:
+        metrics.count("downloads", outcome="failed")
+        raise ValueError(f"FanFicFare failed to download {canonical}: {result.error}")
+    logging.info("Successfully downloaded %s (%s)", result.title, result.path)
+    metrics.count("downloads", outcome="downloaded")
+    cached = await cache.put(cache_key(canonical, result.updated), canonical, result.path)
+    return cached, cache.name(cached)
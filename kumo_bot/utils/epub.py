@@ -0,0 +1,236 @@
+"""Fitting story epubs under Discord's upload limit.
+
+Files within the limit are sent as they are. Larger ones go through
+increasingly lossy stages, all in memory: repacking at maximum compression,
+shrinking embedded images, dropping images altogether, and finally splitting
+the story into volumes.
+"""
+import asyncio
+import io
+import logging
+import math
+import pathlib
+import posixpath
+import re
+import zipfile
+from typing import Dict, List, Optional, Set, Tuple
+
+import discord
+
+try:
+    from PIL import Image
+except ImportError:  # Installed with the bot, without it images can only be dropped.
+    Image = None
+
+# Bytes kept free under the limit for the rest of the upload request
+HEADROOM = 64 * 1024
+# Image shrinking passes: longest side in pixels and JPEG quality
+IMAGE_PASSES = ((1600, 80), (1000, 60), (600, 40))
+# Most volumes a story is split into before giving up
+MAX_VOLUMES = 10
+
+_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+_DOCUMENT_SUFFIXES = {".xhtml", ".html", ".htm"}
+
+_IMG_TAG = re.compile(rb"<img\b[^>]*>", re.I)
+_SVG_BLOCK = re.compile(rb"<svg\b.*?</svg>", re.I | re.S)
+_ITEM_TAG = re.compile(rb"<item\b[^>]*>")
+_ITEMREF_TAG = re.compile(rb"<itemref\b[^>]*>")
+_IMAGE_ITEM = re.compile(rb"<item\b[^>]*media-type=\"image/[^\"]*\"[^>]*>", re.I)
+_COVER_META = re.compile(rb"<meta\b[^>]*name=\"cover\"[^>]*>", re.I)
+_NAV_POINT = re.compile(rb"<navPoint\b.*?</navPoint>", re.S)
+_TITLE = re.compile(rb"(<dc:title\b[^>]*>)(.*?)(</dc:title>)", re.S)
+
+Entries = Dict[str, bytes]
+
+
+def _attr(tag: bytes, name: bytes) -> Optional[str]:
+    match = re.search(rb"\b" + name + rb"=\"([^\"]*)\"", tag)
+    return match.group(1).decode("utf-8") if match else None
+
+
+def _read(path: pathlib.Path) -> Entries:
+    with zipfile.ZipFile(path) as archive:
+        return {info.filename: archive.read(info) for info in archive.infolist() if not info.is_dir()}
+
+
+def _pack(entries: Entries) -> bytes:
+    """Zips entries as an epub, the uncompressed mimetype first as the format requires."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        if "mimetype" in entries:
+            archive.writestr("mimetype", entries["mimetype"], compress_type=zipfile.ZIP_STORED)
+        for name, data in entries.items():
+            if name != "mimetype":
+                archive.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
+    return buffer.getvalue()
+
+
+def _shrink_image(data: bytes, max_side: int, quality: int) -> bytes:
+    """Downscales and recompresses an image in its own format, keeping the original if that is smaller."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            fmt = img.format
+            img.thumbnail((max_side, max_side))
+            out = io.BytesIO()
+            if fmt == "JPEG":
+                img.convert("RGB").save(out, "JPEG", quality=quality, optimize=True)
+            elif fmt == "PNG":
+                img.save(out, "PNG", optimize=True)
+            else:
+                img.save(out, fmt)
+    except (OSError, ValueError) as e:
+        logging.debug("Could not shrink an image: %s", e)
+        return data
+    return min(data, out.getvalue(), key=len)
+
+
+def _shrink_images(entries: Entries, max_side: int, quality: int) -> Entries:
+    return {
+        name: _shrink_image(data, max_side, quality) if posixpath.splitext(name)[1].lower() in _IMAGE_SUFFIXES else data
+        for name, data in entries.items()
+    }
+
+
+def _strip_images(entries: Entries) -> Entries:
+    """A text-only copy of the book, with images and all references to them removed."""
+    stripped = {}
+    for name, data in entries.items():
+        suffix = posixpath.splitext(name)[1].lower()
+        if suffix in _IMAGE_SUFFIXES:
+            continue
+        if suffix in _DOCUMENT_SUFFIXES:
+            data = _IMG_TAG.sub(b"", _SVG_BLOCK.sub(b"", data))
+        elif suffix == ".opf":
+            data = _COVER_META.sub(b"", _IMAGE_ITEM.sub(b"", data))
+        stripped[name] = data
+    return stripped
+
+
+def _drop_tags(pattern: re.Pattern, attr: bytes, dropped: Set[str], data: bytes) -> bytes:
+    """Removes the tags whose ``attr`` names a dropped item."""
+    return pattern.sub(lambda m: b"" if _attr(m.group(0), attr) in dropped else m.group(0), data)
+
+
+def _split(entries: Entries, count: int) -> List[Entries]:
+    """Splits the book's reading order into ``count`` volumes of about equal size.
+
+    Every volume keeps the shared files (stylesheets, package, table of
+    contents) and only the documents of its part of the spine.
+
+    Raises:
+        ValueError: The book has no package file or nothing in its spine.
+    """
+    opf_name = next((name for name in entries if name.endswith(".opf")), None)
+    if opf_name is None:
+        raise ValueError("The epub has no package file to split it by.")
+    opf = entries[opf_name]
+    base = posixpath.dirname(opf_name)
+    hrefs = {}
+    for tag in _ITEM_TAG.findall(opf):
+        item_id, href = _attr(tag, b"id"), _attr(tag, b"href")
+        if item_id and href:
+            hrefs[item_id] = posixpath.normpath(posixpath.join(base, href))
+    spine = [idref for idref in (_attr(tag, b"idref") for tag in _ITEMREF_TAG.findall(opf)) if idref in hrefs]
+    if not spine:
+        raise ValueError("The epub has no documents in its reading order to split.")
+    count = min(count, len(spine))
+
+    # Contiguous parts of the spine, cut by document size.
+    sizes = [len(entries.get(hrefs[idref], b"")) for idref in spine]
+    target = sum(sizes) / count
+    parts: List[List[str]] = [[]]
+    filled = 0
+    for idref, size in zip(spine, sizes):
+        if parts[-1] and filled + size > target and len(parts) < count:
+            parts.append([])
+            filled = 0
+        parts[-1].append(idref)
+        filled += size
+
+    volumes = []
+    for number, part in enumerate(parts, 1):
+        dropped = {idref for idref in spine if idref not in part}
+        dropped_files = {hrefs[idref] for idref in dropped}
+        volume = {}
+        for name, data in entries.items():
+            if name in dropped_files:
+                continue
+            if name == opf_name:
+                data = _drop_tags(_ITEM_TAG, b"id", dropped, data)
+                data = _drop_tags(_ITEMREF_TAG, b"idref", dropped, data)
+                suffix = f" (Part {number} of {len(parts)})".encode("utf-8")
+                data = _TITLE.sub(lambda m, suffix=suffix: m.group(1) + m.group(2) + suffix + m.group(3), data, count=1)
+            elif name.endswith(".ncx"):
+                ncx_base = posixpath.dirname(name)
+
+                def _keep(match: re.Match, ncx_base: str = ncx_base, dropped_files: Set[str] = dropped_files) -> bytes:
+                    src = _attr(match.group(0), b"src") or ""
+                    target_file = posixpath.normpath(posixpath.join(ncx_base, src.split("#")[0]))
+                    return b"" if target_file in dropped_files else match.group(0)
+
+                data = _NAV_POINT.sub(_keep, data)
+            volume[name] = data
+        volumes.append(volume)
+    return volumes
+
+
+def fit(path: pathlib.Path, name: str, limit: int) -> List[Tuple[bytes, str]]:
+    """Brings an epub under an upload limit.
+
+    Args:
+        path: The epub.
+        name: The name the file is sent as.
+        limit: The upload limit in bytes.
+
+    Returns:
+        One or more files and their names, each within the limit.
+
+    Raises:
+        ValueError: The file cannot be brought under the limit, or it has to be
+            split and is missing the parts to split it by.
+    """
+    limit -= HEADROOM
+    if path.stat().st_size <= limit:
+        return [(path.read_bytes(), name)]
+    try:
+        entries = _read(path)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"{name} is over the upload limit and not an epub.") from e
+
+    data = _pack(entries)
+    if len(data) <= limit:
+        logging.info("Repacked %s to fit the upload limit.", name)
+        return [(data, name)]
+    if Image is not None:
+        for max_side, quality in IMAGE_PASSES:
+            data = _pack(_shrink_images(entries, max_side, quality))
+            if len(data) <= limit:
+                logging.info("Shrunk the images of %s to %dpx to fit the upload limit.", name, max_side)
+                return [(data, name)]
+
+    entries = _strip_images(entries)
+    data = _pack(entries)
+    stem = posixpath.splitext(name)[0]
+    if len(data) <= limit:
+        logging.info("Dropped the images of %s to fit the upload limit.", name)
+        return [(data, f"{stem} (text only).epub")]
+
+    for count in range(math.ceil(len(data) / limit), MAX_VOLUMES + 1):
+        volumes = [_pack(volume) for volume in _split(entries, count)]
+        if len(volumes) < count:
+            break
+        if all(len(volume) <= limit for volume in volumes):
+            logging.info("Split %s into %d volumes to fit the upload limit.", name, count)
+            return [(volume, f"{stem} (part {i} of {count}).epub") for i, volume in enumerate(volumes, 1)]
+    raise ValueError(f"{name} cannot be brought under the upload limit.")
+
+
+async def fit_upload(path: pathlib.Path, name: str, limit: int) -> List[discord.File]:
+    """Prepares an epub for upload, off the event loop.
+
+    See ``fit``, the results are streamed from memory so no working files are
+    left behind.
+    """
+    files = await asyncio.to_thread(fit, path, name, limit)
+    return [discord.File(fp=io.BytesIO(data), filename=filename) for data, filename in files]
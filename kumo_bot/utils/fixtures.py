@@ -0,0 +1,96 @@
+"""Recorded vote fixtures.
+
+A fixture holds a vote channel's history over the window a close looks at,
+the ballot and the reactions of its vote message, as ids only: message
+contents and story urls are not kept, submissions are numbered by story
+instead. The owner's ``/override record`` writes them, and the vote
+benchmark replays them to reproduce a close offline.
+
+Fixtures are JSON lines, gzipped if the file name ends in ``.gz``. The
+first line describes the vote; every other line is a message
+``["m", id, author]``, a submission ``["m", id, author, story]`` or a vote
+``["r", position, user]``.
+"""
+import gzip
+import json
+import pathlib
+import re
+from typing import IO, Dict, Iterable, List, Union
+
+import discord
+
+from kumo_bot.config import constants
+from kumo_bot.utils import voting
+from kumo_bot.utils.submissions import parse_submission
+
+MENTION_RE = re.compile(r"<@!?(\d+)>")
+
+Path = Union[str, pathlib.Path]
+
+
+def open_fixture(path: Path, mode: str) -> IO[str]:
+    """Opens a fixture for text, through gzip if its name ends in ``.gz``."""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def story_url(story: int) -> str:
+    """The placeholder url of a recorded story."""
+    return f"https://example.org/s/{story}"
+
+
+async def record(votemsg: discord.Message, path: Path, blacklist: Iterable[int] = (),
+                 democracy: Iterable[int] = ()) -> int:
+    """Writes a vote and the channel history its close reads to a fixture.
+
+    Args:
+        votemsg: The vote message, with its reactions.
+        path: Where to write the fixture.
+        blacklist: Blacklisted user ids at the time of the vote.
+        democracy: Ids of the users exempt from fraud protection.
+
+    Returns:
+        The number of messages recorded.
+    """
+    stories: Dict[str, int] = {}
+    # The header comes first but needs the whole history, so the lines are buffered.
+    lines: List[str] = []
+    async for message in votemsg.channel.history(limit=None,
+                                                 after=votemsg.created_at - constants.HISTORY_WINDOW,
+                                                 before=votemsg,
+                                                 oldest_first=True):
+        url = parse_submission(message.content)
+        line = ["m", message.id, message.author.id]
+        if url is not None:
+            line.append(stories.setdefault(url, len(stories)))
+        lines.append(json.dumps(line))
+    count = len(lines)
+
+    candidates = []
+    for url, submitters in voting.parse_votemsg(votemsg):
+        candidates.append({
+            "story": stories.setdefault(url, len(stories)),
+            "submitters": [int(user_id) for user_id in MENTION_RE.findall(submitters)],
+        })
+    emojis = voting.vote_emojis(votemsg)
+    for reaction in votemsg.reactions:
+        if reaction.emoji not in emojis:
+            continue
+        position = emojis.index(reaction.emoji)
+        async for user in reaction.users():
+            if user.id != votemsg.author.id:
+                lines.append(json.dumps(["r", position, user.id]))
+
+    header = {
+        "channel": votemsg.channel.id,
+        "vote": votemsg.id,
+        "candidates": candidates,
+        "blacklist": sorted(blacklist),
+        "democracy": sorted(democracy),
+    }
+    with open_fixture(path, "w") as fixture:
+        fixture.write(json.dumps(header) + "\n")
+        for line in lines:
+            fixture.write(line + "\n")
+    return count
@@ -0,0 +1,125 @@
+"""Live tally of the running vote, fed by raw reaction events.
+
+Closing a vote used to page through every reaction's users. The tally keeps
+the (user, emoji) pairs of the active vote message up to date from gateway
+events instead, so the close only has to check it against the reaction
+counts of the message.
+"""
+import json
+import logging
+import os
+import pathlib
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+import discord
+
+from kumo_bot.utils.reactions import Ballots
+
+
+class LiveTally:
+    """In-memory tally of the active vote message, saved to disk periodically.
+
+    Attributes:
+        message_id: Id of the tallied vote message, if any.
+        gap: Whether reaction events may have been missed since the tally
+            was last complete.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]) -> None:
+        self._file = pathlib.Path(path)
+        self.message_id: Optional[int] = None
+        self._votes: Dict[str, Set[int]] = {}
+        self.gap = False
+        self.dirty = False
+        self.load()
+
+    def load(self) -> None:
+        """Loads the saved tally, if there is one."""
+        try:
+            with open(self._file, encoding="utf-8") as tally_f:
+                data = json.load(tally_f)
+        except FileNotFoundError:
+            return
+        except json.decoder.JSONDecodeError:
+            logging.warning("Saved vote tally could not be read, ignoring it.")
+            return
+        self.message_id = data["message_id"]
+        self._votes = {emoji: set(users) for emoji, users in data["votes"].items()}
+        # Nothing was listening while the bot was down.
+        self.gap = True
+
+    def save(self) -> None:
+        """Writes the tally to disk."""
+        if self.message_id is None:
+            return
+        data = {"message_id": self.message_id, "votes": {emoji: list(users) for emoji, users in self._votes.items()}}
+        tmp = self._file.with_suffix(".tmp")
+        with open(tmp, encoding="utf-8", mode="w") as tally_f:
+            json.dump(data, tally_f)
+        os.replace(tmp, self._file)
+        self.dirty = False
+
+    def start(self, message_id: int, emojis: Iterable[str]) -> None:
+        """Starts tallying a new vote message."""
+        self.message_id = message_id
+        self._votes = {emoji: set() for emoji in emojis}
+        self.gap = False
+        self.save()
+
+    def stop(self) -> None:
+        """Drops the tally once its vote is closed."""
+        self.message_id = None
+        self._votes = {}
+        self.dirty = False
+        self._file.unlink(missing_ok=True)
+
+    def replace(self, ballots: Ballots) -> None:
+        """Replaces the tally with freshly collected ballots."""
+        self._votes = {emoji: set() for emoji in self._votes}
+        for user_id, emojis in ballots.voters.items():
+            for emoji in emojis:
+                self._votes.setdefault(emoji, set()).add(user_id)
+        self.gap = False
+        self.dirty = True
+
+    # EVENTS
+
+    def add(self, payload: discord.RawReactionActionEvent) -> None:
+        """Records an added reaction."""
+        emoji = str(payload.emoji)
+        if payload.message_id == self.message_id and emoji in self._votes:
+            self._votes[emoji].add(payload.user_id)
+            self.dirty = True
+
+    def remove(self, payload: discord.RawReactionActionEvent) -> None:
+        """Records a removed reaction."""
+        emoji = str(payload.emoji)
+        if payload.message_id == self.message_id and emoji in self._votes:
+            self._votes[emoji].discard(payload.user_id)
+            self.dirty = True
+
+    def clear(self, message_id: int, emoji: Optional[str] = None) -> None:
+        """Records reactions being cleared, either all or of one emoji."""
+        if message_id != self.message_id:
+            return
+        for key, users in self._votes.items():
+            if emoji is None or key == emoji:
+                users.clear()
+        self.dirty = True
+
+    # CLOSING
+
+    def matches(self, message: discord.Message) -> bool:
+        """Checks the tally against the reaction counts of the vote message."""
+        if self.gap or message.id != self.message_id:
+            return False
+        counts = {str(reaction.emoji): reaction.count - reaction.me for reaction in message.reactions}
+        return all(counts.get(emoji, 0) == len(users) for emoji, users in self._votes.items())
+
+    def ballots(self, emojis: List[str]) -> Ballots:
+        """The tally as ballots, in the same shape the reaction collector returns."""
+        ballots = Ballots()
+        for emoji in emojis:
+            for user_id in self._votes.get(emoji, ()):
+                ballots.voters.setdefault(user_id, []).append(emoji)
+        return ballots
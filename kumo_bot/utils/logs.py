@@ -0,0 +1,176 @@
+"""Logging off the event loop.
+
+Records are put on a queue by the handler the loggers see and written to the
+log file by a background thread, so a slow disk or a rotation never stalls
+the event loop. The file rotates by size and by age, and can be written as
+JSON lines carrying the vote and phase the record was logged in.
+
+Only the standard library is used here, as the constants build the default
+handler from this module.
+"""
+import atexit
+import collections
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import pathlib
+import queue
+import time
+from typing import Any, Deque, List, Mapping, Optional, Union
+
+# Fields of the task a record is logged from, see ``bind``
+_context: contextvars.ContextVar[Mapping[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+# The same layout discord.py uses for its own log file
+TEXT = logging.Formatter("[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{")
+
+
+def bind(**fields: Any) -> None:
+    """Adds fields to the records of the current task and the tasks it starts.
+
+    Used with ``vote`` and ``phase``, the JSON formatter writes them with
+    every record.
+    """
+    _context.set({**_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Attaches the fields bound in the logging task to its records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _context.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON lines, with their bound fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RotatingHandler(logging.handlers.RotatingFileHandler):
+    """Rotates a log file once it grows past a size or a new interval begins.
+
+    Intervals are counted from the epoch, so daily rotation happens at
+    midnight UTC, and a file left from before a restart is rotated as soon
+    as its interval is over.
+
+    Args:
+        filename: The log file, appended to across restarts.
+        max_bytes: Size that starts a new file.
+        interval: Seconds each file covers at most.
+        backups: Rotated files kept.
+    """
+
+    def __init__(self, filename: Union[str, pathlib.Path], max_bytes: int, interval: float, backups: int) -> None:
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        self.interval = interval
+        try:
+            written = os.stat(self.baseFilename).st_mtime
+        except OSError:
+            written = time.time()
+        self._period = self._period_of(written)
+
+    def _period_of(self, when: float) -> int:
+        return int(when // self.interval)
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self._period_of(record.created) != self._period:
+            if os.path.exists(self.baseFilename):
+                return True
+            self._period = self._period_of(record.created)
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self._period = self._period_of(time.time())
+
+
+class QueuedHandler(logging.handlers.QueueHandler):
+    """A handler passing records to ``handlers`` on a background thread.
+
+    The thread only starts with ``start``, which ``install`` calls, so the
+    handlers can be configured first without a record slipping out before.
+    It then runs until the interpreter exits, writing out what is left in
+    the queue before it does.
+    """
+
+    def __init__(self, *handlers: logging.Handler) -> None:
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        super().__init__(records)
+        self.listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        self.addFilter(ContextFilter())
+        self._started = False
+
+    def start(self) -> None:
+        """Starts the writing thread, does nothing if already started."""
+        if not self._started:
+            self._started = True
+            self.listener.start()
+            atexit.register(self.listener.stop)
+
+
+def install(handler: logging.Handler, level: int = logging.INFO) -> None:
+    """Routes the root logger, and with it discord.py's loggers, to a handler.
+
+    Queued handlers start writing from here, call it once they are configured.
+    """
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    if isinstance(handler, QueuedHandler):
+        handler.start()
+
+
+def _matches(line: str, fields: Mapping[str, str], text: Optional[str]) -> bool:
+    if text is not None and text.lower() not in line.lower():
+        return False
+    if not fields:
+        return True
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        # Text lines only carry their level
+        level = fields.get("level", "")
+        return set(fields) == {"level"} and f"[{level.upper()}" in line
+    return isinstance(entry, dict) and all(
+        str(entry.get(key)).lower() == value.lower() for key, value in fields.items())
+
+
+def tail(path: Union[str, pathlib.Path],
+         lines: int,
+         fields: Optional[Mapping[str, str]] = None,
+         text: Optional[str] = None) -> List[str]:
+    """The last lines of a log file that match a filter.
+
+    Args:
+        path: The log file.
+        lines: Most lines returned.
+        fields: Values JSON lines must have, such as ``vote`` or ``level``.
+        text: Text lines must contain, ignoring case.
+    """
+    found: Deque[str] = collections.deque(maxlen=lines)
+    try:
+        with open(path, encoding="utf-8", errors="replace") as log:
+            for line in log:
+                line = line.rstrip("\n")
+                if line and _matches(line, fields or {}, text):
+                    found.append(line)
+    except FileNotFoundError:
+        return []
+    return list(found)
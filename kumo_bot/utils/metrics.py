@@ -0,0 +1,244 @@
+"""Runtime metrics of the bot.
+
+Commands time their phases with a stopwatch, and counters track REST calls,
+rate limits and scanned messages. Everything is kept in process and served in
+the Prometheus text format on a local HTTP endpoint.
+"""
+import dataclasses
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+Labels = Tuple[Tuple[str, str], ...]
+Watcher = Callable[[str, str, float], None]
+
+# Help texts of the known counters, exported as kumo_<name>_total
+COUNTERS = {
+    "rest_requests": "REST requests made to Discord.",
+    "rate_limits": "Times Discord rate limited a request and it had to be retried.",
+    "messages_scanned": "Channel messages fetched by history scans.",
+    "reaction_users": "Users fetched from vote reactions.",
+    "downloads": "Story fetches by outcome.",
+}
+
+
+@dataclasses.dataclass
+class PhaseStats:
+    """Accumulated timings of one phase of an operation."""
+    count: int = 0
+    total: float = 0.0
+    last: float = 0.0
+    max: float = 0.0
+
+
+class Stopwatch:
+    """Times consecutive phases of one run of an operation.
+
+    Every ``lap`` records the time since the previous lap (or the start)
+    under the given phase, so phases can be marked without restructuring the
+    code they measure. The laps of the run are kept in order in ``laps``.
+    """
+
+    def __init__(self, registry: "Metrics", operation: str) -> None:
+        self._registry = registry
+        self._operation = operation
+        self._start = self._last = time.perf_counter()
+        self.laps: List[Tuple[str, float]] = []
+
+    def lap(self, phase: str) -> float:
+        """Ends the current phase, returning its duration."""
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.laps.append((phase, elapsed))
+        self._registry.observe(self._operation, phase, elapsed)
+        return elapsed
+
+    def skip(self) -> None:
+        """Starts the next phase without recording the time since the last lap."""
+        self._last = time.perf_counter()
+
+    def finish(self) -> float:
+        """Records the whole run as the ``total`` phase, returning its duration."""
+        elapsed = time.perf_counter() - self._start
+        self._registry.observe(self._operation, "total", elapsed)
+        return elapsed
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f"{key}=\"{_escape(value)}\"" for key, value in labels) + "}"
+
+
+class Metrics:
+    """In-process registry of counters and phase timings."""
+
+    def __init__(self) -> None:
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.phases: Dict[Tuple[str, str], PhaseStats] = {}
+        self.started = time.time()
+        self._watchers: List[Watcher] = []
+
+    def count(self, name: str, amount: float = 1, **labels: str) -> None:
+        """Increments a counter."""
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def total(self, name: str) -> float:
+        """Sum of a counter over all its labels."""
+        return sum(value for (counter, _), value in self.counters.items() if counter == name)
+
+    def observe(self, operation: str, phase: str, seconds: float) -> None:
+        """Records the duration of a phase."""
+        stats = self.phases.setdefault((operation, phase), PhaseStats())
+        stats.count += 1
+        stats.total += seconds
+        stats.last = seconds
+        stats.max = max(stats.max, seconds)
+        for watcher in self._watchers:
+            watcher(operation, phase, seconds)
+
+    def watch(self, watcher: Watcher) -> None:
+        """Calls back with the operation, phase and duration of every recorded phase."""
+        self._watchers.append(watcher)
+
+    def unwatch(self, watcher: Watcher) -> None:
+        """Stops calling back a watcher."""
+        self._watchers.remove(watcher)
+
+    def stopwatch(self, operation: str) -> Stopwatch:
+        """Starts timing a run of an operation."""
+        return Stopwatch(self, operation)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for name in sorted({name for name, _ in self.counters}):
+            metric = f"kumo_{name}_total"
+            lines.append(f"# HELP {metric} {COUNTERS.get(name, name)}")
+            lines.append(f"# TYPE {metric} counter")
+            for (counter, labels), value in sorted(self.counters.items()):
+                if counter == name:
+                    lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+        if self.phases:
+            lines.append("# HELP kumo_phase_seconds Time spent in each phase of an operation.")
+            lines.append("# TYPE kumo_phase_seconds summary")
+            for (operation, phase), stats in sorted(self.phases.items()):
+                labels = _format_labels((("operation", operation), ("phase", phase)))
+                lines.append(f"kumo_phase_seconds_sum{labels} {stats.total:.6f}")
+                lines.append(f"kumo_phase_seconds_count{labels} {stats.count}")
+            lines.append("# HELP kumo_phase_seconds_max Longest observed duration of each phase.")
+            lines.append("# TYPE kumo_phase_seconds_max gauge")
+            for (operation, phase), stats in sorted(self.phases.items()):
+                labels = _format_labels((("operation", operation), ("phase", phase)))
+                lines.append(f"kumo_phase_seconds_max{labels} {stats.max:.6f}")
+        lines.append("# HELP kumo_start_time_seconds When the bot process started.")
+        lines.append("# TYPE kumo_start_time_seconds gauge")
+        lines.append(f"kumo_start_time_seconds {self.started:.0f}")
+        resident = rss()
+        if resident is not None:
+            lines.append("# HELP kumo_resident_memory_bytes Resident memory of the bot process.")
+            lines.append("# TYPE kumo_resident_memory_bytes gauge")
+            lines.append(f"kumo_resident_memory_bytes {resident}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """A short human readable summary of the metrics."""
+        lines = []
+        for name in COUNTERS:
+            label = name.replace("_", " ").capitalize()
+            lines.append(f"**{label}**: {self.total(name):g}")
+        operation = None
+        for (op, phase), stats in sorted(self.phases.items()):
+            if op != operation:
+                operation = op
+                lines.append(f"**{op}**")
+            lines.append(f"- {phase}: last {stats.last:.2f}s, avg {stats.total / stats.count:.2f}s, "
+                         f"max {stats.max:.2f}s over {stats.count}")
+        return "\n".join(lines)
+
+
+def rss() -> Optional[int]:
+    """Resident memory of the process in bytes, if the platform reports it."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss() -> Optional[int]:
+    """Highest resident memory of the process in bytes, if the platform reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RateLimitCounter(logging.Handler):
+    """Counts the rate limit warnings discord.py logs before retrying a request."""
+
+    def __init__(self, registry: Metrics) -> None:
+        super().__init__(logging.WARNING)
+        self._registry = registry
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if "rate limit" in record.getMessage().lower():
+            self._registry.count("rate_limits")
+
+
+metrics = Metrics()
+
+
+def instrument_http(http) -> None:
+    """Counts the REST requests and rate limits of a client's HTTP client."""
+    request = http.request
+
+    async def counted_request(route, **kwargs):
+        metrics.count("rest_requests", method=route.method, route=route.path)
+        return await request(route, **kwargs)
+
+    http.request = counted_request
+    logging.getLogger("discord.http").addHandler(RateLimitCounter(metrics))
+
+
+async def _serve_metrics(request: web.Request) -> web.Response:
+    del request
+    return web.Response(body=metrics.render().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def serve(host: str, port: int) -> Optional[web.AppRunner]:
+    """Serves the metrics on ``/metrics``.
+
+    Returns:
+        The running server, to be cleaned up on shutdown, or None if the
+        port could not be bound.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", _serve_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logging.warning("Could not serve metrics on %s:%d: %s", host, port, e)
+        await runner.cleanup()
+        return None
+    logging.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return runner
@@ -0,0 +1,100 @@
+"""Speculative downloads of vote candidates.
+
+While a vote is open every candidate is downloaded in the background, so the
+close can attach the winner's file right away instead of waiting for it.
+"""
+import asyncio
+import logging
+import pathlib
+from typing import Dict, List, Optional, Tuple
+
+from kumo_bot.utils.download_queue import PRIORITY_PREFETCH, DownloadJob, DownloadQueue
+
+
+class Prefetcher:
+    """Downloads the candidates of the running vote ahead of its close.
+
+    Candidates go through the download queue at low priority, so they share
+    in-flight jobs with manual downloads and never jump ahead of them. Only
+    stories that were not cached yet are thrown away when the vote closes,
+    and only if no ``/download`` asked for them meanwhile.
+
+    Args:
+        queue: The bot's download queue.
+        concurrency: How many candidates are downloaded at once. Kept below
+            the queue's workers so manual downloads are not starved.
+        timeout: Seconds a single candidate may take.
+    """
+
+    def __init__(self, queue: DownloadQueue, concurrency: int, timeout: float) -> None:
+        self._queue = queue
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._timeout = timeout
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._downloaded: Dict[str, DownloadJob] = {}
+        self.status: Dict[str, str] = {}
+
+    def start(self, urls: List[str]) -> None:
+        """Starts prefetching a new set of candidates, dropping any previous ones."""
+        self.cancel()
+        for url in urls:
+            self.status[url] = "queued"
+            task = asyncio.create_task(self._fetch(url), name=f"prefetch {url}")
+            # Failures are reported through the status, not as unretrieved exceptions.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._tasks[url] = task
+
+    async def _fetch(self, url: str) -> Tuple[pathlib.Path, str]:
+        async with self._semaphore:
+            self.status[url] = "downloading"
+            await self._queue.load()
+            cached = self._queue.cached(url)
+            job = self._queue.submit(url, priority=PRIORITY_PREFETCH)
+            if not cached:
+                self._downloaded[url] = job
+            try:
+                result = await asyncio.wait_for(self._queue.wait(job), timeout=self._timeout)
+            except asyncio.CancelledError:
+                self.status[url] = "cancelled"
+                raise
+            except Exception as e:
+                self.status[url] = f"failed ({e})"
+                logging.info("Prefetch of %s failed: %s", url, e)
+                raise
+            finally:
+                self._queue.release(job)
+        self.status[url] = "ready"
+        return result
+
+    def take(self, url: str) -> Optional[Tuple[pathlib.Path, str]]:
+        """The prefetched file of the winner, cancelling the other candidates.
+
+        Never waits: if the winner is still queued or downloading, None is
+        returned and the caller submits it at interactive priority, which
+        joins the prefetch's job and moves it to the front of the queue.
+
+        Returns:
+            The file and its name, or None if it is not ready or failed.
+        """
+        for other, task in self._tasks.items():
+            if other != url:
+                task.cancel()
+        task = self._tasks.get(url)
+        if task is None or not task.done() or task.cancelled() or task.exception() is not None:
+            return None
+        return task.result()
+
+    def finish(self, keep: Optional[str] = None) -> None:
+        """Stops prefetching and throws away the stories it downloaded, but ``keep``."""
+        downloaded = [job for url, job in self._downloaded.items() if url != keep]
+        self.cancel()
+        for job in downloaded:
+            self._queue.discard(job)
+
+    def cancel(self) -> None:
+        """Cancels outstanding prefetches and forgets all candidates."""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks = {}
+        self._downloaded = {}
+        self.status = {}
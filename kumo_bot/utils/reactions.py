@@ -0,0 +1,62 @@
+"""Collection of voters from vote message reactions."""
+import asyncio
+import dataclasses
+import logging
+import time
+from typing import Dict, Iterable, List, Union
+
+import discord
+
+from kumo_bot.utils.metrics import metrics
+
+User = Union[discord.Member, discord.User]
+
+
+@dataclasses.dataclass
+class Ballots:
+    """Voters of a vote message.
+
+    Attributes:
+        voters: User ids mapped to the emojis they reacted with, in ballot order.
+        elapsed: Seconds spent collecting.
+    """
+    voters: Dict[int, List[str]] = dataclasses.field(default_factory=dict)
+    elapsed: float = 0.0
+
+
+async def _fetch_users(reaction: discord.Reaction, semaphore: asyncio.Semaphore) -> List[User]:
+    async with semaphore:
+        return [user async for user in reaction.users()]
+
+
+async def collect_voters(reactions: Iterable[discord.Reaction], emojis: List[str], concurrency: int,
+                         exclude: int) -> Ballots:
+    """Fetches the users of all candidate reactions concurrently.
+
+    Each reaction still pages through its users in order, but the reactions
+    themselves are fetched side by side. discord.py waits out rate limits on
+    its own, the semaphore keeps the number of requests in flight bounded.
+
+    Args:
+        reactions: Reactions of the vote message.
+        emojis: Candidate emojis, in ballot order.
+        concurrency: Maximum number of reactions fetched at once.
+        exclude: User id to ignore, normally the bot itself.
+    """
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    candidates = [reaction for reaction in reactions if reaction.emoji in emojis]
+    candidates.sort(key=lambda reaction: emojis.index(reaction.emoji))
+    results = await asyncio.gather(*(_fetch_users(reaction, semaphore) for reaction in candidates))
+
+    metrics.count("reaction_users", sum(len(users) for users in results))
+    ballots = Ballots()
+    for reaction, users in zip(candidates, results):
+        for user in users:
+            if user.id == exclude:
+                continue
+            ballots.voters.setdefault(user.id, []).append(reaction.emoji)
+    ballots.elapsed = time.perf_counter() - start
+    logging.info("Collected %d voters from %d reactions in %.2fs.", len(ballots.voters), len(candidates),
+                 ballots.elapsed)
+    return ballots
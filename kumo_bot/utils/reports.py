@@ -0,0 +1,136 @@
+"""Vote reports rendered within Discord's message limits.
+
+Reports are built line by line and joined once, then split over as many
+embeds and messages as the limits need. Fraud protection logs of large votes
+are summarised inline and attached in full as a CSV file.
+"""
+import collections
+import csv
+import io
+from typing import Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import discord
+
+from kumo_bot import tally
+from kumo_bot.utils import voting
+
+# Discord's limits on embed descriptions and on the embeds of a single message
+DESCRIPTION_LIMIT = 4096
+MESSAGE_EMBEDS = 10
+MESSAGE_CHARACTERS = 6000
+
+# Disregarded users listed inline before the log is attached as a file instead
+INLINE_USERS = 100
+
+Channel = Union[discord.TextChannel, discord.Thread]
+
+
+def paginate(lines: Iterable[str], limit: int = DESCRIPTION_LIMIT) -> List[str]:
+    """Joins lines into pages of at most ``limit`` characters, cutting overlong lines."""
+    pages: List[str] = []
+    page: List[str] = []
+    size = 0
+    for line in lines:
+        line = line[:limit]
+        if page and size + len(line) + 1 > limit:
+            pages.append("\n".join(page))
+            page, size = [], 0
+        page.append(line)
+        size += len(line) + 1
+    if page:
+        pages.append("\n".join(page))
+    return pages
+
+
+def embeds(title: str, lines: Iterable[str], colour: int, footer: Optional[str] = None) -> List[discord.Embed]:
+    """The lines as one embed per page, numbered in the title if there is more than one."""
+    pages = paginate(lines) or [""]
+    result = []
+    for number, page in enumerate(pages, 1):
+        embed = discord.Embed(title=title if len(pages) == 1 else f"{title} ({number}/{len(pages)})",
+                              description=page,
+                              color=colour)
+        result.append(embed)
+    if footer is not None:
+        result[-1].set_footer(text=footer)
+    return result
+
+
+async def send(channel: Channel,
+               report: Sequence[discord.Embed],
+               file: Optional[discord.File] = None,
+               **kwargs) -> discord.Message:
+    """Sends embeds in as few messages as the limits allow, the file with the last.
+
+    Returns:
+        The last message sent.
+    """
+    batches: List[List[discord.Embed]] = [[]]
+    size = 0
+    for embed in report:
+        if batches[-1] and (len(batches[-1]) >= MESSAGE_EMBEDS or size + len(embed) > MESSAGE_CHARACTERS):
+            batches.append([])
+            size = 0
+        batches[-1].append(embed)
+        size += len(embed)
+    for batch in batches[:-1]:
+        await channel.send(embeds=batch, **kwargs)
+    if file is not None:
+        kwargs["file"] = file
+    return await channel.send(embeds=batches[-1], **kwargs)
+
+
+def results(emojis: Sequence[str], votes: Mapping[str, int]) -> List[discord.Embed]:
+    """The vote counts of every candidate."""
+    lines = ["This week's featured results are:"]
+    lines.extend(f"{emoji} - {votes[emoji]} vote{voting.plurls(votes[emoji])}" for emoji in emojis)
+    return embeds("RESULTS", lines, 0x00FF00)
+
+
+def _messages(user: int, reason: str, activity: Mapping[int, float]) -> str:
+    if user in activity:
+        return f"{activity[user]} message{voting.plurls(activity[user])}"
+    if reason == tally.BLACKLISTED:
+        return "Blacklisted"
+    return "0 messages"
+
+
+def fraud_csv(counted: tally.Tally, activity: Mapping[int, float]) -> discord.File:
+    """The full fraud protection log as a CSV file."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["user_id", "reason", "messages"])
+    for user, reason in counted.disregarded.items():
+        writer.writerow([user, reason, activity.get(user, 0)])
+    return discord.File(io.BytesIO(buffer.getvalue().encode("utf-8")), filename="fraud-protection.csv")
+
+
+def fraud(counted: tally.Tally, activity: Mapping[int, float]) -> Tuple[List[discord.Embed], Optional[discord.File]]:
+    """The fraud protection log of a counted vote.
+
+    Args:
+        counted: The counted vote.
+        activity: Messages each user sent in the window before the vote.
+
+    Returns:
+        The embeds of the log, and the full log as a file if it is too long
+        to list inline.
+    """
+    if not counted.disregarded:
+        return embeds("Fraud Protection Log", ["No users were disregarded."], 0x00FFF7,
+                      "Thank you for your cooperation."), None
+
+    lines = [
+        f"Total disregarded votes: {counted.disregarded_votes}",
+        f"Total disregarded users: {len(counted.disregarded)}",
+    ]
+    file = None
+    if len(counted.disregarded) > INLINE_USERS:
+        reasons = collections.Counter(counted.disregarded.values())
+        lines.extend(f"{reason.capitalize()}: {users}" for reason, users in reasons.items())
+        lines.append("The full list of disregarded users is attached.")
+        file = fraud_csv(counted, activity)
+    else:
+        lines.append("Disregarded users:")
+        lines.extend(f"<@{user}> - {_messages(user, reason, activity)}" for user, reason in counted.disregarded.items())
+    return embeds("Fraud Protection Log", lines, 0xFC0303, "This is a public safety announcement."), file
@@ -0,0 +1,154 @@
+"""Resumable channel history scanning.
+
+Every local index built from channel history shares the same problem: the
+first scan is expensive, later scans should only fetch what is new, and a scan
+cut short by a reboot should not start over. ``HistoryScanner`` keeps a
+checkpoint per channel in the index's own database and advances it together
+with the data of every processed batch.
+"""
+import datetime
+import logging
+import sqlite3
+from typing import Callable, List, Optional, Tuple, Union
+
+import discord
+
+from kumo_bot.utils.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    scope TEXT NOT NULL,
+    channel_id INTEGER NOT NULL,
+    low INTEGER NOT NULL,
+    high INTEGER NOT NULL,
+    PRIMARY KEY (scope, channel_id)
+);
+"""
+
+_BATCH = 100
+
+Channel = Union[discord.TextChannel, discord.Thread]
+Consumer = Callable[[List[discord.Message]], None]
+
+
+class HistoryScanner:
+    """Walks channel history from a persisted checkpoint.
+
+    The checkpoint of a channel is a range of message ids: every message with
+    ``low < id <= high`` has been handed to the consumer. Scans extend the
+    range downwards to the requested start and upwards to the newest message,
+    committing the checkpoint with each batch.
+
+    Args:
+        db: Connection of the index the scanner feeds.
+        scope: Name separating this index's checkpoints from others.
+    """
+
+    def __init__(self, db: sqlite3.Connection, scope: str) -> None:
+        self._db = db
+        self._scope = scope
+        self._live: set[int] = set()
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def checkpoint(self, channel_id: int) -> Optional[Tuple[int, int]]:
+        """The scanned id range of a channel, if it was ever scanned."""
+        row = self._db.execute("SELECT low, high FROM checkpoints WHERE scope = ? AND channel_id = ?",
+                               (self._scope, channel_id)).fetchone()
+        return None if row is None else (row[0], row[1])
+
+    def _save(self, channel_id: int, low: int, high: int) -> None:
+        self._db.execute("INSERT OR REPLACE INTO checkpoints (scope, channel_id, low, high) VALUES (?, ?, ?, ?)",
+                         (self._scope, channel_id, low, high))
+        self._db.commit()
+
+    def tracked(self) -> List[int]:
+        """Ids of all channels with a checkpoint."""
+        return [
+            row[0] for row in self._db.execute("SELECT channel_id FROM checkpoints WHERE scope = ?", (self._scope,))
+        ]
+
+    def advance(self, message: discord.Message) -> None:
+        """Moves the checkpoint over a message received live.
+
+        Only done while the channel is known to be gap free, otherwise the
+        data is just committed and the next scan catches up.
+        """
+        cov = self.checkpoint(message.channel.id)
+        if cov is not None and message.channel.id in self._live and message.id > cov[1]:
+            self._save(message.channel.id, cov[0], message.id)
+        else:
+            self._db.commit()
+
+    def suspend(self) -> None:
+        """Marks all channels as possibly missing messages.
+
+        Called when a new gateway session starts, as events sent while the bot
+        was away are not replayed.
+        """
+        self._live.clear()
+
+    def restrict(self, channel_id: int, low: int) -> None:
+        """Moves the lower end of a checkpoint up after old data was dropped."""
+        cov = self.checkpoint(channel_id)
+        if cov is not None and low > cov[0]:
+            self._save(channel_id, low, max(cov[1], low))
+
+    async def scan(self, channel: Channel, after: datetime.datetime, consume: Consumer) -> int:
+        """Brings a channel's checkpoint to cover ``after`` up to now.
+
+        Args:
+            channel: The channel to scan.
+            after: The oldest time the checkpoint has to cover.
+            consume: Called with each batch of new messages. It should write
+                without committing so data and checkpoint land together.
+
+        Returns:
+            The number of messages fetched.
+        """
+        target = discord.utils.time_snowflake(after, high=True)
+        cov = self.checkpoint(channel.id)
+        if cov is None:
+            logging.info("Starting %s scan of %s.", self._scope, channel)
+            cov = (target, target)
+            self._save(channel.id, *cov)
+        low, high = cov
+        fetched = 0
+
+        # Older messages are walked newest first, so the range stays contiguous after every batch.
+        if target < low:
+            batch: List[discord.Message] = []
+            async for message in channel.history(limit=None,
+                                                 after=discord.Object(target),
+                                                 before=discord.Object(low + 1),
+                                                 oldest_first=False):
+                batch.append(message)
+                if len(batch) >= _BATCH:
+                    consume(batch)
+                    low = batch[-1].id - 1
+                    self._save(channel.id, low, high)
+                    fetched += len(batch)
+                    batch = []
+            consume(batch)
+            fetched += len(batch)
+            low = target
+            self._save(channel.id, low, high)
+
+        batch = []
+        async for message in channel.history(limit=None, after=discord.Object(high), oldest_first=True):
+            batch.append(message)
+            if len(batch) >= _BATCH:
+                consume(batch)
+                high = max(batch[-1].id, self.checkpoint(channel.id)[1])
+                self._save(channel.id, low, high)
+                fetched += len(batch)
+                batch = []
+        consume(batch)
+        fetched += len(batch)
+        if batch:
+            high = max(batch[-1].id, self.checkpoint(channel.id)[1])
+        self._save(channel.id, low, high)
+        self._live.add(channel.id)
+        metrics.count("messages_scanned", fetched, scope=self._scope)
+        logging.info("Scanned %d new messages of %s for %s.", fetched, channel, self._scope)
+        return fetched
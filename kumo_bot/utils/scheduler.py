@@ -0,0 +1,216 @@
+"""Durable scheduler for timed jobs such as vote closes.
+
+Jobs are keyed, so scheduling a key again moves the job instead of adding a
+second one. Every job is kept in a heap and saved to disk, and a single task
+sleeps until the earliest one is due, so restarts resume pending jobs and no
+sleeper is left behind in command handlers.
+"""
+import asyncio
+import dataclasses
+import heapq
+import itertools
+import json
+import logging
+import pathlib
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import discord
+
+from kumo_bot.config.settings import write_json
+
+Handler = Callable[[str], Awaitable[None]]
+
+# How long a job whose handler raised waits before its first retry, doubling with every further one
+RETRY_DELAY = timedelta(minutes=5)
+# Retries of a failing job before it is dropped
+MAX_RETRIES = 3
+# Errors retrying cannot fix, such as a deleted channel or message, the job is dropped right away
+PERMANENT_ERRORS = (discord.NotFound, discord.Forbidden)
+
+
+@dataclasses.dataclass
+class ScheduledJob:
+    """A pending job.
+
+    Attributes:
+        key: Identifies the job, e.g. the vote it closes.
+        action: Name of the handler that runs it.
+        when: When it is due.
+        attempts: Times its handler failed so far.
+    """
+    key: str
+    action: str
+    when: datetime
+    seq: int = 0
+    attempts: int = 0
+
+
+class Scheduler:
+    """Runs keyed jobs at their due time, each until it completes once.
+
+    Handlers are registered per action and get the job's key. A due job stays
+    saved while its handler runs and is only removed once the handler
+    returns, so a job interrupted by a restart runs again on start, as do
+    jobs that came due while the bot was down. A handler that raises is
+    retried with a doubling delay up to ``MAX_RETRIES`` times, unless the
+    error is one of ``PERMANENT_ERRORS``. Handlers therefore have to tolerate
+    running again after a partial run, as the vote close does by checking
+    whether the vote is still running.
+
+    Args:
+        path: Where pending jobs are saved.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]) -> None:
+        self._file = pathlib.Path(path)
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._handlers: Dict[str, Handler] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Dict[asyncio.Task, ScheduledJob] = {}
+        self.load()
+
+    def load(self) -> None:
+        """Loads the saved jobs."""
+        try:
+            with open(self._file, encoding="utf-8") as schedule_f:
+                saved = json.load(schedule_f)
+        except FileNotFoundError:
+            return
+        except json.decoder.JSONDecodeError:
+            logging.warning("Saved schedule could not be read, starting empty.")
+            return
+        for job in saved:
+            self._add(job["key"], job["action"], datetime.fromtimestamp(job["when"], tz=timezone.utc),
+                      job.get("attempts", 0))
+
+    def _save(self) -> None:
+        write_json(str(self._file), [{
+            "key": job.key,
+            "action": job.action,
+            "when": job.when.timestamp(),
+            "attempts": job.attempts
+        } for job in self.jobs()])
+
+    def _add(self, key: str, action: str, when: datetime, attempts: int = 0) -> ScheduledJob:
+        # Replaced entries stay in the heap and are skipped when they come up.
+        job = ScheduledJob(key, action, when, next(self._seq), attempts)
+        self._jobs[key] = job
+        heapq.heappush(self._heap, (when.timestamp(), job.seq, key))
+        return job
+
+    def register(self, action: str, handler: Handler) -> None:
+        """Sets the coroutine function that runs jobs of an action."""
+        self._handlers[action] = handler
+
+    def schedule(self, key: str, action: str, when: datetime) -> ScheduledJob:
+        """Schedules a job, replacing any pending job with the same key."""
+        job = self._add(key, action, when)
+        self._save()
+        self._wakeup.set()
+        logging.info("Scheduled %s for %s at %s.", action, key, when)
+        return job
+
+    def reschedule(self, key: str, when: datetime) -> Optional[ScheduledJob]:
+        """Moves a pending job, returning None if there is none for the key."""
+        job = self._jobs.get(key)
+        if job is None:
+            return None
+        return self.schedule(key, job.action, when)
+
+    def cancel(self, key: str) -> bool:
+        """Cancels a pending job, returning whether there was one."""
+        if self._jobs.pop(key, None) is None:
+            return False
+        self._save()
+        logging.info("Cancelled scheduled job %s.", key)
+        return True
+
+    def get(self, key: str) -> Optional[ScheduledJob]:
+        """The pending job of a key."""
+        return self._jobs.get(key)
+
+    def jobs(self) -> List[ScheduledJob]:
+        """All pending jobs, earliest first."""
+        return sorted(self._jobs.values(), key=lambda job: job.when)
+
+    def start(self) -> None:
+        """Starts running jobs, does nothing if already started."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="scheduler")
+
+    def stop(self) -> None:
+        """Stops the scheduler and cancels running handlers; their jobs stay saved with the pending ones."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+
+    def _next(self) -> Optional[ScheduledJob]:
+        """The earliest pending job, dropping replaced heap entries."""
+        while self._heap:
+            _, seq, key = self._heap[0]
+            job = self._jobs.get(key)
+            if job is not None and job.seq == seq:
+                return job
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            job = self._next()
+            if job is None:
+                await self._wakeup.wait()
+                continue
+            delay = job.when.timestamp() - datetime.now(timezone.utc).timestamp()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # The job leaves the heap but stays saved until its handler completes.
+            heapq.heappop(self._heap)
+            handler = self._handlers.get(job.action)
+            if handler is None:
+                logging.error("No handler for scheduled %s of %s, dropping it.", job.action, job.key)
+                del self._jobs[job.key]
+                self._save()
+                continue
+            logging.info("Running scheduled %s for %s.", job.action, job.key)
+            task = asyncio.create_task(handler(job.key), name=f"{job.action} {job.key}")
+            self._running[task] = job
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        job = self._running.pop(task)
+        if task.cancelled():
+            # Only stop() cancels handlers, the saved job runs again on the next start.
+            return
+        error = task.exception()
+        if self._jobs.get(job.key) is not job:
+            # Cancelled or rescheduled while it ran, whatever replaced it stays.
+            if error is not None:
+                logging.error("Scheduled job %s failed.", task.get_name(), exc_info=error)
+            return
+        if error is not None and not isinstance(error, PERMANENT_ERRORS) and job.attempts < MAX_RETRIES:
+            delay = RETRY_DELAY * 2**job.attempts
+            logging.error("Scheduled job %s failed, retry %d of %d in %s.",
+                          task.get_name(),
+                          job.attempts + 1,
+                          MAX_RETRIES,
+                          delay,
+                          exc_info=error)
+            self._add(job.key, job.action, datetime.now(timezone.utc) + delay, job.attempts + 1)
+            self._save()
+            self._wakeup.set()
+            return
+        if error is not None:
+            logging.error("Scheduled job %s failed for good, dropping it.", task.get_name(), exc_info=error)
+        del self._jobs[job.key]
+        self._save()
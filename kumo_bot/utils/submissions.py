@@ -0,0 +1,141 @@
+"""Ledger of link submissions posted in suggestion channels.
+
+Starting a vote used to walk the whole suggestion channel. The ledger is fed
+by the Tracking cog instead, keeps one row per submission message and lets
+``startvote`` read the candidates for a time window directly.
+"""
+import datetime
+import pathlib
+import re
+import sqlite3
+from typing import Iterator, List, NamedTuple, Optional, Union
+
+import discord
+
+from kumo_bot.utils.scanning import HistoryScanner
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    message_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    url TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_by_channel ON submissions (channel_id, message_id);
+CREATE INDEX IF NOT EXISTS submissions_by_author ON submissions (channel_id, author_id, message_id);
+"""
+
+URL_RE = re.compile(r"(?P<url>https?://\S+)")
+
+Channel = Union[discord.TextChannel, discord.Thread]
+
+
+class Submission(NamedTuple):
+    """A single submission from the ledger."""
+    message_id: int
+    author_id: int
+    url: str
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        """When the submission was posted."""
+        return discord.utils.snowflake_time(self.message_id)
+
+
+def parse_submission(content: str) -> Optional[str]:
+    """Returns the submitted url if the message content is a submission."""
+    if not content.startswith("https://"):
+        return None
+    url = URL_RE.search(content)
+    if url is None:
+        return None
+    return url.group("url")
+
+
+class SubmissionLedger:
+    """SQLite backed ledger of submissions per channel.
+
+    Like the activity index, the recorded part of each channel's history is
+    tracked by a ``HistoryScanner`` checkpoint.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]) -> None:
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self.scanner = HistoryScanner(self._db, "submissions")
+
+    def close(self) -> None:
+        """Closes the underlying database."""
+        self._db.close()
+
+    def tracked(self) -> List[int]:
+        """Ids of the channels the ledger keeps track of."""
+        return self.scanner.tracked()
+
+    def _add(self, message_id: int, channel_id: int, author_id: int, url: str) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO submissions (message_id, channel_id, author_id, url) VALUES (?, ?, ?, ?)",
+            (message_id, channel_id, author_id, url))
+
+    # LIVE FEED
+
+    def record(self, message: discord.Message) -> None:
+        """Records a freshly posted message of a tracked channel."""
+        if self.scanner.checkpoint(message.channel.id) is None:
+            return
+        url = parse_submission(message.content)
+        if url is not None:
+            self._add(message.id, message.channel.id, message.author.id, url)
+        self.scanner.advance(message)
+
+    def edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        """Follows edits that add, change or remove a submission link."""
+        content = payload.data.get("content")
+        if content is None or self.scanner.checkpoint(payload.channel_id) is None:
+            return
+        url = parse_submission(content)
+        if url is None:
+            self.forget([payload.message_id])
+            return
+        author = payload.data.get("author", {}).get("id")
+        if author is None:
+            self._db.execute("UPDATE submissions SET url = ? WHERE message_id = ?", (url, payload.message_id))
+        else:
+            self._add(payload.message_id, payload.channel_id, int(author), url)
+        self._db.commit()
+
+    def forget(self, message_ids) -> None:
+        """Removes deleted messages from the ledger."""
+        self._db.executemany("DELETE FROM submissions WHERE message_id = ?", ((mid,) for mid in message_ids))
+        self._db.commit()
+
+    def suspend(self) -> None:
+        """Marks all channels as possibly missing messages."""
+        self.scanner.suspend()
+
+    # SCANNING
+
+    def _consume(self, batch: List[discord.Message]) -> None:
+        for message in batch:
+            url = parse_submission(message.content)
+            if url is not None:
+                self._add(message.id, message.channel.id, message.author.id, url)
+
+    async def sync(self, channel: Channel, after: datetime.datetime) -> None:
+        """Makes sure the ledger covers the channel from ``after`` up to now."""
+        await self.scanner.scan(channel, after, self._consume)
+
+    # QUERIES
+
+    def entries(self, channel_id: int, after: datetime.datetime) -> Iterator[Submission]:
+        """Submissions posted after the given time, oldest first.
+
+        Every submission is returned, callers keep the first one of each author
+        that passes their own filters.
+        """
+        rows = self._db.execute(
+            "SELECT message_id, author_id, url FROM submissions WHERE channel_id = ? AND message_id > ? "
+            "ORDER BY message_id", (channel_id, discord.utils.time_snowflake(after, high=True)))
+        for row in rows:
+            yield Submission(row[0], row[1], row[2])
@@ -0,0 +1,171 @@
+"""Per-host throttling and circuit breaking for story fetches.
+
+Fiction sites are slow, rate limit, or go down entirely. Every fetch goes
+through a slot of its host here: only a few fetches run per host, each within
+a deadline, failures back off with jitter, and a host that keeps failing is
+skipped outright until a cool-down has passed. The backoff grows with the
+host's recent latency and error rate, and a host that has been failing is
+paced by its latency even after it succeeds again.
+"""
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import logging
+import random
+import time
+from typing import AsyncIterator, Deque, Dict, Optional
+
+
+class CircuitOpen(ConnectionError):
+    """Raised instead of fetching from a host that is considered down."""
+
+
+@dataclasses.dataclass
+class HostState:
+    """Rolling health of a single host."""
+    semaphore: asyncio.Semaphore
+    latencies: Deque[float]
+    outcomes: Deque[bool]
+    consecutive_failures: int = 0
+    not_before: float = 0.0
+    open_until: Optional[float] = None
+    probing: bool = False
+
+    @property
+    def error_rate(self) -> float:
+        """Share of failed fetches in the window."""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def latency(self) -> float:
+        """Average latency of successful fetches in the window."""
+        if not self.latencies:
+            return 0.0
+        return sum(self.latencies) / len(self.latencies)
+
+
+class HostScheduler:
+    """Hands out fetch slots per host.
+
+    Args:
+        per_host: Concurrent fetches allowed per host.
+        window: Number of recent fetches the health is computed from.
+        error_threshold: Error rate at which the circuit opens.
+        min_samples: Fetches needed in the window before the rate counts.
+        max_failures: Consecutive failures that open the circuit regardless.
+        cooldown: Seconds an open circuit rejects fetches before a trial.
+        base_backoff: Seconds of backoff after the first failure.
+        max_backoff: Upper bound of the backoff.
+        timeout: Seconds a fetch may hold its slot before it counts as failed.
+    """
+
+    def __init__(self,
+                 per_host: int = 1,
+                 window: int = 20,
+                 error_threshold: float = 0.5,
+                 min_samples: int = 4,
+                 max_failures: int = 3,
+                 cooldown: float = 600,
+                 base_backoff: float = 5,
+                 max_backoff: float = 300,
+                 timeout: float = 600) -> None:
+        self.per_host = per_host
+        self.window = window
+        self.error_threshold = error_threshold
+        self.min_samples = min_samples
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.hosts: Dict[str, HostState] = {}
+
+    def _state(self, host: str) -> HostState:
+        state = self.hosts.get(host)
+        if state is None:
+            state = HostState(asyncio.Semaphore(self.per_host), collections.deque(maxlen=self.window),
+                              collections.deque(maxlen=self.window))
+            self.hosts[host] = state
+        return state
+
+    def _check_circuit(self, host: str, state: HostState) -> None:
+        if state.open_until is None:
+            return
+        remaining = state.open_until - time.monotonic()
+        if remaining > 0 or state.probing:
+            raise CircuitOpen(f"{host} is failing, not fetching from it for another {max(0, round(remaining))}s.")
+        # Cool-down is over, let a single trial through.
+        state.probing = True
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[None]:
+        """Holds one of the host's fetch slots for the duration of a fetch.
+
+        Raises:
+            CircuitOpen: The host is considered down.
+            TimeoutError: The fetch ran past ``timeout``, it counts as a failure.
+        """
+        state = self._state(host)
+        self._check_circuit(host, state)
+        async with state.semaphore:
+            delay = state.not_before - time.monotonic()
+            if delay > 0:
+                logging.info("Backing off %s for %.1fs.", host, delay)
+                await asyncio.sleep(delay)
+            start = time.monotonic()
+            try:
+                async with asyncio.timeout(self.timeout):
+                    yield
+            except asyncio.CancelledError:
+                state.probing = False
+                raise
+            except TimeoutError:
+                logging.warning("Fetch from %s timed out after %.0fs.", host, self.timeout)
+                self._failure(host, state)
+                raise
+            except Exception:
+                self._failure(host, state)
+                raise
+            else:
+                self._success(state, time.monotonic() - start)
+
+    def _success(self, state: HostState, latency: float) -> None:
+        state.outcomes.append(True)
+        state.latencies.append(latency)
+        state.consecutive_failures = 0
+        # A host that has been failing gets its requests spaced out by its latency.
+        state.not_before = time.monotonic() + state.latency * state.error_rate
+        state.open_until = None
+        state.probing = False
+
+    def _failure(self, host: str, state: HostState) -> None:
+        state.outcomes.append(False)
+        state.consecutive_failures += 1
+        # Slow hosts wait at least their latency, and longer the more of their fetches fail.
+        backoff = max(self.base_backoff * 2**(state.consecutive_failures - 1), state.latency)
+        backoff = min(self.max_backoff, backoff * (1 + state.error_rate))
+        state.not_before = time.monotonic() + backoff * random.uniform(0.5, 1.5)
+        tripped = (state.consecutive_failures >= self.max_failures or
+                   (len(state.outcomes) >= self.min_samples and state.error_rate >= self.error_threshold))
+        if state.probing or tripped:
+            state.open_until = time.monotonic() + self.cooldown
+            logging.warning("Opening circuit for %s after %d consecutive failures (%.0f%% errors).", host,
+                            state.consecutive_failures, state.error_rate * 100)
+        state.probing = False
+
+    def describe(self) -> str:
+        """A line per host summarising its health."""
+        now = time.monotonic()
+        lines = []
+        for host, state in sorted(self.hosts.items()):
+            if state.open_until is not None and state.open_until > now:
+                circuit = f"open for {round(state.open_until - now)}s"
+            elif state.open_until is not None:
+                circuit = "half-open"
+            else:
+                circuit = "closed"
+            lines.append(f"{host}: {state.latency:.1f}s avg, {state.error_rate:.0%} errors, circuit {circuit}")
+        return "\n".join(lines)
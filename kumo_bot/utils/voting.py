@@ -1,6 +1,8 @@
 """Voting utilities for parsing and processing votes."""
 import discord
 
+from kumo_bot.config import constants
+
 
 def parse_votemsg(votemsg: discord.Message) -> list[tuple[str, str]]:
     """Parses the previous vote messages into a list of all submissions."""
@@ -22,8 +24,18 @@ def parse_votemsg(votemsg: discord.Message) -> list[tuple[str, str]]:
     return all_competitors
 
 
+def vote_emojis(votemsg: discord.Message) -> list[str]:
+    """The candidate emojis of a vote message."""
+    return constants.EMOJI_ALPHABET[:len(parse_votemsg(votemsg))]
+
+
 def plurls(items: int) -> str:
     """Provide count of items, get s or nothing."""
     if items <= 1:
         return ""
     return "s"
+
+
+def close_key(vote_id: int) -> str:
+    """The scheduler key of a vote's close."""
+    return f"vote:{vote_id}"